@@ -5,7 +5,7 @@ import pandas as pd
 from datetime import datetime, timedelta
 import urllib.parse
 from database.token_db import get_br_symbol, get_token, get_oa_symbol
-from utils.httpx_client import get_httpx_client
+from utils.httpx_client import get_httpx_client, get_async_httpx_client
 from utils.logging import get_logger
 from broker.angel.utils.client_info import get_angel_headers
 
@@ -36,20 +36,53 @@ def get_api_response(endpoint, auth, method="GET", payload=''):
         else:
             response = client.request(method, url, headers=headers, content=payload)
         
-        # Add status attribute for compatibility with the existing codebase
-        response.status = response.status_code
+        return _parse_api_response(response, headers)
+    except json.JSONDecodeError:
+        logger.error(f"Debug - Failed to parse response. Status code: {response.status_code}")
+        logger.debug(f"Debug - Response text: {response.text}")
+        raise Exception(f"Failed to parse API response (status {response.status_code})")
+
+
+async def aget_api_response(endpoint, auth, method="GET", payload=''):
+    """Async variant of get_api_response using the shared httpx.AsyncClient"""
+    AUTH_TOKEN = auth
+    api_key = os.getenv('BROKER_API_KEY')
+
+    client = get_async_httpx_client()
+    headers = get_angel_headers(AUTH_TOKEN, api_key)
+
+    if isinstance(payload, dict):
+        payload = json.dumps(payload)
+
+    url = f"https://apiconnect.angelbroking.com{endpoint}"
+    
+    try:
+        if method == "GET":
+            response = await client.get(url, headers=headers)
+        elif method == "POST":
+            response = await client.post(url, headers=headers, content=payload)
+        else:
+            response = await client.request(method, url, headers=headers, content=payload)
         
-        if response.status_code == 403:
-            logger.debug(f"Debug - API returned 403 Forbidden. Headers: {headers}")
-            logger.debug(f"Debug - Response text: {response.text}")
-            raise Exception("Authentication failed. Please check your API key and auth token.")
-            
-        return json.loads(response.text)
+        return _parse_api_response(response, headers)
     except json.JSONDecodeError:
         logger.error(f"Debug - Failed to parse response. Status code: {response.status_code}")
         logger.debug(f"Debug - Response text: {response.text}")
         raise Exception(f"Failed to parse API response (status {response.status_code})")
 
+
+def _parse_api_response(response, headers):
+    """Check an Angel API response for auth failures and decode its JSON body"""
+    # Add status attribute for compatibility with the existing codebase
+    response.status = response.status_code
+    
+    if response.status_code == 403:
+        logger.debug(f"Debug - API returned 403 Forbidden. Headers: {headers}")
+        logger.debug(f"Debug - Response text: {response.text}")
+        raise Exception("Authentication failed. Please check your API key and auth token.")
+        
+    return json.loads(response.text)
+
 class BrokerData:  
     def __init__(self, auth_token):
         """Initialize Angel data handler with authentication token"""
@@ -79,60 +112,83 @@ class BrokerData:
             dict: Quote data with required fields
         """
         try:
-            # Convert symbol to broker format and get token
-            br_symbol = get_br_symbol(symbol, exchange)
-            token = get_token(symbol, exchange)
-
-            if exchange == 'NSE_INDEX':
-                exchange = 'NSE'
-            elif exchange == 'BSE_INDEX':
-                exchange = 'BSE'
-            elif exchange == 'MCX_INDEX':
-                exchange = 'MCX'
-            
-            # Prepare payload for Angel's quote API
-            payload = {
-                "mode": "FULL",
-                "exchangeTokens": {
-                    exchange: [token]
-                }
-            }
-            
             response = get_api_response("/rest/secure/angelbroking/market/v1/quote/", 
                                       self.auth_token, 
                                       "POST", 
-                                      payload)
-            
-            if not response.get('status'):
-                raise Exception(f"Error from Angel API: {response.get('message', 'Unknown error')}")
-            
-            # Extract quote data from response
-            fetched_data = response.get('data', {}).get('fetched', [])
-            if not fetched_data:
-                raise Exception("No quote data received")
-                
-            quote = fetched_data[0]
-            
-            # Return quote in common format
-            depth = quote.get('depth', {})
-            bids = depth.get('buy', [])
-            asks = depth.get('sell', [])
+                                      self._quote_payload(symbol, exchange))
+            return self._parse_quote(response)
             
-            return {
-                'bid': float(bids[0].get('price', 0)) if bids else 0,
-                'ask': float(asks[0].get('price', 0)) if asks else 0,
-                'open': float(quote.get('open', 0)),
-                'high': float(quote.get('high', 0)),
-                'low': float(quote.get('low', 0)),
-                'ltp': float(quote.get('ltp', 0)),
-                'prev_close': float(quote.get('close', 0)),
-                'volume': int(quote.get('tradeVolume', 0)),
-                'oi': int(quote.get('opnInterest', 0))
-            }
+        except Exception as e:
+            raise Exception(f"Error fetching quotes: {str(e)}")
+
+    async def aget_quotes(self, symbol: str, exchange: str) -> dict:
+        """
+        Get real-time quotes for given symbol without blocking the event loop
+        Args:
+            symbol: Trading symbol
+            exchange: Exchange (e.g., NSE, BSE, NFO, BFO, CDS, MCX)
+        Returns:
+            dict: Quote data with required fields
+        """
+        try:
+            response = await aget_api_response("/rest/secure/angelbroking/market/v1/quote/", 
+                                             self.auth_token, 
+                                             "POST", 
+                                             self._quote_payload(symbol, exchange))
+            return self._parse_quote(response)
             
         except Exception as e:
             raise Exception(f"Error fetching quotes: {str(e)}")
 
+    def _quote_payload(self, symbol: str, exchange: str) -> dict:
+        """Build the FULL-mode quote request payload for a symbol"""
+        # Convert symbol to broker format and get token
+        token = get_token(symbol, exchange)
+
+        if exchange == 'NSE_INDEX':
+            exchange = 'NSE'
+        elif exchange == 'BSE_INDEX':
+            exchange = 'BSE'
+        elif exchange == 'MCX_INDEX':
+            exchange = 'MCX'
+        
+        # Prepare payload for Angel's quote API
+        return {
+            "mode": "FULL",
+            "exchangeTokens": {
+                exchange: [token]
+            }
+        }
+
+    def _parse_quote(self, response: dict) -> dict:
+        """Convert an Angel quote API response to the common quote format"""
+        if not response.get('status'):
+            raise Exception(f"Error from Angel API: {response.get('message', 'Unknown error')}")
+        
+        # Extract quote data from response
+        fetched_data = response.get('data', {}).get('fetched', [])
+        if not fetched_data:
+            raise Exception("No quote data received")
+            
+        quote = fetched_data[0]
+        
+        # Return quote in common format
+        depth = quote.get('depth', {})
+        bids = depth.get('buy', [])
+        asks = depth.get('sell', [])
+        
+        return {
+            'bid': float(bids[0].get('price', 0)) if bids else 0,
+            'ask': float(asks[0].get('price', 0)) if asks else 0,
+            'open': float(quote.get('open', 0)),
+            'high': float(quote.get('high', 0)),
+            'low': float(quote.get('low', 0)),
+            'ltp': float(quote.get('ltp', 0)),
+            'prev_close': float(quote.get('close', 0)),
+            'volume': int(quote.get('tradeVolume', 0)),
+            'oi': int(quote.get('opnInterest', 0))
+        }
+
 
     def get_history(self, symbol: str, exchange: str, interval: str, 
                    start_date: str, end_date: str) -> pd.DataFrame:
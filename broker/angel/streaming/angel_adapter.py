@@ -114,6 +114,7 @@ class AngelWebSocketAdapter(BaseBrokerWebSocketAdapter):
         
         if self.reconnect_attempts >= self.max_reconnect_attempts:
             self.logger.error("Max reconnection attempts reached. Giving up.")
+            self.notify_disconnect()
     
     def disconnect(self) -> None:
         """Disconnect from Angel WebSocket"""
@@ -2,12 +2,41 @@
 Authentication helper utilities for Angel broker.
 """
 import os
+import threading
+import time
 from datetime import datetime
-from database.auth_db import get_auth_token, get_feed_token, store_tokens, clear_tokens
+import broker.angel.api.auth_api as auth_api
+from database.auth_db import (
+    get_auth_token, get_auth_token_preview, get_feed_token, get_any_user_tokens, get_token_expiry,
+    store_tokens, clear_tokens, add_token_listener
+)
 from utils.logging import get_logger
 
 logger = get_logger(__name__)
 
+# Serializes broker logins so concurrent callers don't each hit the Angel login API
+_auth_lock = threading.Lock()
+
+# Last tokens returned by auto_authenticate: (auth_token, feed_token, user_id, expiry_epoch)
+_last_good = None
+
+
+def _invalidate_last_good(user_id: str = None):
+    """Drop the cached tokens so the next auto_authenticate re-checks storage"""
+    global _last_good
+    _last_good = None
+
+
+def _remember_tokens(auth_token: str, feed_token: str, user_id: str):
+    """Cache tokens for auto_authenticate if their expiry is known"""
+    global _last_good
+    expiry = get_token_expiry(user_id)
+    _last_good = (auth_token, feed_token, user_id, expiry) if expiry else None
+
+
+# Any store/clear in auth_db makes the cached tokens stale
+add_token_listener(_invalidate_last_good)
+
 
 def auto_authenticate(client_code: str = None, pin: str = None, totp: str = None) -> tuple:
     """
@@ -21,34 +50,37 @@ def auto_authenticate(client_code: str = None, pin: str = None, totp: str = None
     Returns:
         tuple: (auth_token, feed_token, error_message)
     """
+    # Fast path: reuse the tokens returned last time while they are unexpired
+    cached = _last_good
+    if cached and cached[3] > time.time() and (not client_code or client_code == cached[2]):
+        return cached[0], cached[1], None
+    
     # First try to use stored tokens
     # Try with provided client_code first, then default
     stored_auth_token = None
     stored_feed_token = None
+    stored_user_id = None
     
     if client_code:
         stored_auth_token = get_auth_token(client_code)
         stored_feed_token = get_feed_token(client_code)
+        stored_user_id = client_code
     
     # If not found with client_code, try default
     if not (stored_auth_token and stored_feed_token):
         stored_auth_token = get_auth_token('default')
         stored_feed_token = get_feed_token('default')
+        stored_user_id = 'default'
     
     # If still not found, try to find any stored tokens
     if not (stored_auth_token and stored_feed_token):
-        from database.auth_db import _auth_tokens, _feed_tokens
-        if _auth_tokens and _feed_tokens:
-            # Get the first available token pair
-            for user_id in _auth_tokens:
-                if user_id in _feed_tokens and _auth_tokens[user_id] and _feed_tokens[user_id]:
-                    stored_auth_token = _auth_tokens[user_id]
-                    stored_feed_token = _feed_tokens[user_id]
-                    logger.info(f"Using stored authentication tokens for user {user_id}")
-                    break
+        stored_user_id, stored_auth_token, stored_feed_token = get_any_user_tokens()
+        if stored_user_id:
+            logger.info(f"Using stored authentication tokens for user {stored_user_id}")
     
     if stored_auth_token and stored_feed_token:
         logger.info("Using stored authentication tokens")
+        _remember_tokens(stored_auth_token, stored_feed_token, stored_user_id)
         return stored_auth_token, stored_feed_token, None
     
     # If no stored tokens or they're expired, authenticate with credentials
@@ -63,19 +95,25 @@ def auto_authenticate(client_code: str = None, pin: str = None, totp: str = None
             logger.debug(error_msg)
             return None, None, error_msg
     
-    # Authenticate with Angel (import here to avoid circular import)
-    from broker.angel.api.auth_api import authenticate_broker
-    logger.info("Authenticating with Angel broker using provided credentials")
-    auth_token, feed_token, error = authenticate_broker(client_code, pin, totp)
-    
-    if auth_token and feed_token:
-        # Store tokens for future use with client code as user ID
-        store_tokens(auth_token, feed_token, client_code if client_code else 'default')
-        logger.info("Authentication successful and tokens stored")
-        return auth_token, feed_token, None
-    else:
-        logger.error(f"Authentication failed: {error}")
-        return None, None, error
+    with _auth_lock:
+        # Another caller may have authenticated while we were waiting for the lock
+        stored_auth_token = get_auth_token(client_code)
+        stored_feed_token = get_feed_token(client_code)
+        if stored_auth_token and stored_feed_token:
+            logger.info("Using tokens stored by a concurrent authentication")
+            return stored_auth_token, stored_feed_token, None
+        
+        logger.info("Authenticating with Angel broker using provided credentials")
+        auth_token, feed_token, error = auth_api.authenticate_broker(client_code, pin, totp)
+        
+        if auth_token and feed_token:
+            # Store tokens for future use with client code as user ID
+            store_tokens(auth_token, feed_token, client_code if client_code else 'default')
+            logger.info("Authentication successful and tokens stored")
+            return auth_token, feed_token, None
+        else:
+            logger.error(f"Authentication failed: {error}")
+            return None, None, error
 
 
 def refresh_authentication(client_code: str, pin: str, totp: str) -> tuple:
@@ -90,22 +128,22 @@ def refresh_authentication(client_code: str, pin: str, totp: str) -> tuple:
     Returns:
         tuple: (auth_token, feed_token, error_message)
     """
-    # Clear existing tokens first
-    clear_tokens('default')
-    
-    # Authenticate fresh (import here to avoid circular import)
-    from broker.angel.api.auth_api import authenticate_broker
-    logger.info("Refreshing authentication tokens")
-    auth_token, feed_token, error = authenticate_broker(client_code, pin, totp)
-    
-    if auth_token and feed_token:
-        # Store new tokens
-        store_tokens(auth_token, feed_token, client_code)
-        logger.info("Authentication refreshed and tokens stored")
-        return auth_token, feed_token, None
-    else:
-        logger.error(f"Authentication refresh failed: {error}")
-        return None, None, error
+    with _auth_lock:
+        # Clear existing tokens first
+        _invalidate_last_good()
+        clear_tokens('default')
+        
+        logger.info("Refreshing authentication tokens")
+        auth_token, feed_token, error = auth_api.authenticate_broker(client_code, pin, totp)
+        
+        if auth_token and feed_token:
+            # Store new tokens
+            store_tokens(auth_token, feed_token, client_code)
+            logger.info("Authentication refreshed and tokens stored")
+            return auth_token, feed_token, None
+        else:
+            logger.error(f"Authentication refresh failed: {error}")
+            return None, None, error
 
 
 def is_authenticated() -> bool:
@@ -134,6 +172,6 @@ def get_authentication_status() -> dict:
         'authenticated': bool(auth_token and feed_token),
         'has_auth_token': bool(auth_token),
         'has_feed_token': bool(feed_token),
-        'auth_token_preview': f"{auth_token[:10]}..." if auth_token else None,
+        'auth_token_preview': get_auth_token_preview('default'),
         'timestamp': datetime.now().isoformat()
     }
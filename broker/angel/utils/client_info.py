@@ -3,12 +3,17 @@ Utility functions for getting client information for Angel API headers.
 """
 import socket
 import uuid
+from functools import lru_cache
 
 
+@lru_cache(maxsize=1)
 def get_client_info():
     """
     Get client IP and MAC address information for Angel API headers.
     
+    The lookup involves a hostname resolution and a MAC query, so it is
+    performed once per process and reused for every request.
+    
     Returns:
         tuple: (client_local_ip, client_public_ip, mac_address)
     """
@@ -23,29 +28,20 @@ def get_client_info():
     
     # Get MAC address
     try:
-        mac_address = ':'.join(['{:02x}'.format((uuid.getnode() >> elements) & 0xff) 
-                               for elements in range(0, 2*6, 2)][::-1])
+        node = uuid.getnode()
+        mac_address = ':'.join(f'{(node >> shift) & 0xff:02x}' for shift in range(40, -1, -8))
     except Exception:
         mac_address = '00:00:00:00:00:00'
     
     return client_local_ip, client_public_ip, mac_address
 
 
-def get_angel_headers(auth_token, api_key):
-    """
-    Get standardized headers for Angel API requests.
-    
-    Args:
-        auth_token: JWT authentication token
-        api_key: Angel API key
-        
-    Returns:
-        dict: Complete headers dictionary for Angel API
-    """
+@lru_cache(maxsize=1)
+def _base_headers():
+    """Build the static part of the Angel headers once per process."""
     client_local_ip, client_public_ip, mac_address = get_client_info()
     
     return {
-        'Authorization': f'Bearer {auth_token}',
         'Content-Type': 'application/json',
         'Accept': 'application/json',
         'X-UserType': 'USER',
@@ -53,5 +49,21 @@ def get_angel_headers(auth_token, api_key):
         'X-ClientLocalIP': client_local_ip,
         'X-ClientPublicIP': client_public_ip,
         'X-MACAddress': mac_address,
-        'X-PrivateKey': api_key
     }
+
+
+def get_angel_headers(auth_token, api_key):
+    """
+    Get standardized headers for Angel API requests.
+    
+    Args:
+        auth_token: JWT authentication token
+        api_key: Angel API key
+        
+    Returns:
+        dict: Complete headers dictionary for Angel API
+    """
+    headers = _base_headers().copy()
+    headers['Authorization'] = f'Bearer {auth_token}'
+    headers['X-PrivateKey'] = api_key
+    return headers
@@ -15,36 +15,41 @@ try:
 except ImportError:
     pass
 
+# Snapshot of the environment, read once when settings are defined
+_env = dict(os.environ)
+
 
 class Settings:
     """Configuration settings"""
     
     # Server Configuration
-    HOST: str = os.getenv("HOST", "0.0.0.0")
-    PORT: int = int(os.getenv("PORT", "8000"))
-    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
-    RELOAD: bool = os.getenv("RELOAD", "False").lower() == "true"
+    HOST: str = _env.get("HOST", "0.0.0.0")
+    PORT: int = int(_env.get("PORT", "8000"))
+    LOG_LEVEL: str = _env.get("LOG_LEVEL", "INFO").upper()
+    RELOAD: bool = _env.get("RELOAD", "False").lower() == "true"
+    WORKERS: int = int(_env.get("WEB_CONCURRENCY", "1"))
     
     # Database Configuration
-    DATABASE_PATH: str = os.getenv("DATABASE_PATH", "prices.db")
-    TICK_RETENTION_DAYS: int = int(os.getenv("TICK_RETENTION_DAYS", "7"))
+    DATABASE_PATH: str = _env.get("DATABASE_PATH", "prices.db")
+    TICK_RETENTION_DAYS: int = int(_env.get("TICK_RETENTION_DAYS", "7"))
     
     # Angel Broker Configuration
-    BROKER_API_KEY: str = os.getenv("BROKER_API_KEY", "")
-    BROKER_API_SECRET: str = os.getenv("BROKER_API_SECRET", "")
+    BROKER_API_KEY: str = _env.get("BROKER_API_KEY", "")
+    BROKER_API_SECRET: str = _env.get("BROKER_API_SECRET", "")
     
     # Streaming Configuration
-    MIN_UPDATE_INTERVAL: float = float(os.getenv("MIN_UPDATE_INTERVAL", "1.0"))
-    RECONNECT_DELAY: int = int(os.getenv("RECONNECT_DELAY", "5"))
-    MAX_RECONNECT_DELAY: int = int(os.getenv("MAX_RECONNECT_DELAY", "60"))
-    MAX_RECONNECT_ATTEMPTS: int = int(os.getenv("MAX_RECONNECT_ATTEMPTS", "10"))
+    MIN_UPDATE_INTERVAL: float = float(_env.get("MIN_UPDATE_INTERVAL", "1.0"))
+    RECONNECT_DELAY: int = int(_env.get("RECONNECT_DELAY", "5"))
+    MAX_RECONNECT_DELAY: int = int(_env.get("MAX_RECONNECT_DELAY", "60"))
+    MAX_RECONNECT_ATTEMPTS: int = int(_env.get("MAX_RECONNECT_ATTEMPTS", "10"))
     
     # API Configuration
-    CORS_ORIGINS: List[str] = os.getenv("CORS_ORIGINS", "*").split(",")
-    REQUEST_TIMEOUT: int = int(os.getenv("REQUEST_TIMEOUT", "30"))
+    CORS_ORIGINS: List[str] = _env.get("CORS_ORIGINS", "*").split(",")
+    REQUEST_TIMEOUT: int = int(_env.get("REQUEST_TIMEOUT", "30"))
     
     # WebSocket Configuration
-    WS_HEARTBEAT_INTERVAL: int = int(os.getenv("WS_HEARTBEAT_INTERVAL", "30"))
+    WS_HEARTBEAT_INTERVAL: int = int(_env.get("WS_HEARTBEAT_INTERVAL", "30"))
+    WS_PER_MESSAGE_DEFLATE: bool = _env.get("WS_PER_MESSAGE_DEFLATE", "True").lower() == "true"
     
     # Default Symbols to Stream
     DEFAULT_SYMBOLS: List[Dict[str, str]] = [
@@ -81,6 +86,7 @@ class Settings:
         print("=" * 50)
         print(f"Host: {cls.HOST}")
         print(f"Port: {cls.PORT}")
+        print(f"Workers: {cls.WORKERS}")
         print(f"Log Level: {cls.LOG_LEVEL}")
         print(f"Database Path: {cls.DATABASE_PATH}")
         print(f"Tick Retention Days: {cls.TICK_RETENTION_DAYS}")
@@ -89,6 +95,7 @@ class Settings:
         print(f"Max Reconnect Attempts: {cls.MAX_RECONNECT_ATTEMPTS}")
         print(f"Default Symbols: {len(cls.DEFAULT_SYMBOLS)}")
         print(f"CORS Origins: {cls.CORS_ORIGINS}")
+        print(f"WebSocket Compression: {cls.WS_PER_MESSAGE_DEFLATE}")
         print("=" * 50)
 
 
@@ -4,62 +4,174 @@ Persistent storage implementation for the real-time price system.
 """
 import os
 import json
-from datetime import datetime, timedelta
+import atexit
+import threading
+import time
+from datetime import datetime
 from utils.logging import get_logger
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 logger = get_logger(__name__)
 
 # File-based storage for authentication tokens
 TOKEN_FILE = 'angel_tokens.json'
 
+# Delay before dirty tokens are flushed to disk, so bursts of updates share one write
+SAVE_DEBOUNCE_SECONDS = 0.5
+
 # In-memory cache for performance
 _auth_tokens = {}
 _feed_tokens = {}
-_token_expiry = {}  # Track token expiry times
+_token_expiry = {}  # Track token expiry times (epoch seconds)
+_auth_token_previews = {}  # Truncated auth tokens for status display
+_loaded = False  # Set once the token file has been read
+
+# Serializes access to the token caches and the pending flush timer
+_lock = threading.RLock()
+_dirty = False
+_save_timer = None
+
+# Callbacks invoked with the user_id whenever that user's tokens change
+_token_listeners = []
+
+def _dumps(data) -> bytes:
+    """Serialize token data compactly to UTF-8 bytes, preferring orjson"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode()
+
+def _loads(raw: bytes):
+    """Parse token data from bytes, preferring orjson"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def _preview(auth_token: str) -> str:
+    """Truncated form of an auth token that is safe to display"""
+    return auth_token[:10] + '...'
 
 def _load_tokens():
     """Load tokens from file storage"""
-    global _auth_tokens, _feed_tokens, _token_expiry
+    global _auth_tokens, _feed_tokens, _token_expiry, _auth_token_previews, _loaded
     
-    if os.path.exists(TOKEN_FILE):
-        try:
-            with open(TOKEN_FILE, 'r') as f:
-                data = json.load(f)
-                _auth_tokens = data.get('auth_tokens', {})
-                _feed_tokens = data.get('feed_tokens', {})
-                _token_expiry = data.get('token_expiry', {})
-                
-                # Clean up expired tokens
-                current_time = datetime.now()
-                expired_users = []
-                for user_id, expiry_str in _token_expiry.items():
-                    if datetime.fromisoformat(expiry_str) < current_time:
-                        expired_users.append(user_id)
-                
-                for user_id in expired_users:
-                    _auth_tokens.pop(user_id, None)
-                    _feed_tokens.pop(user_id, None)
-                    _token_expiry.pop(user_id, None)
-                    logger.info(f"Expired tokens cleaned for user {user_id}")
+    with _lock:
+        if os.path.exists(TOKEN_FILE):
+            try:
+                with open(TOKEN_FILE, 'rb') as f:
+                    data = _loads(f.read())
+                    _auth_tokens = data.get('auth_tokens', {})
+                    _feed_tokens = data.get('feed_tokens', {})
+                    _token_expiry = {
+                        user_id: datetime.fromisoformat(expiry_str).timestamp()
+                        for user_id, expiry_str in data.get('token_expiry', {}).items()
+                    }
                     
-        except Exception as e:
-            logger.error(f"Error loading tokens: {e}")
-            _auth_tokens = {}
-            _feed_tokens = {}
-            _token_expiry = {}
+                    # Clean up expired tokens
+                    current_time = time.time()
+                    expired_users = [user_id for user_id, expiry in _token_expiry.items()
+                                     if expiry < current_time]
+                    
+                    for user_id in expired_users:
+                        _auth_tokens.pop(user_id, None)
+                        _feed_tokens.pop(user_id, None)
+                        _token_expiry.pop(user_id, None)
+                        logger.info(f"Expired tokens cleaned for user {user_id}")
+                    
+                    _auth_token_previews = {
+                        user_id: _preview(auth_token) for user_id, auth_token in _auth_tokens.items()
+                    }
+                        
+            except Exception as e:
+                logger.error(f"Error loading tokens: {e}")
+                _auth_tokens = {}
+                _feed_tokens = {}
+                _token_expiry = {}
+                _auth_token_previews = {}
+        
+        _loaded = True
 
 def _save_tokens():
-    """Save tokens to file storage"""
-    try:
-        data = {
-            'auth_tokens': _auth_tokens,
-            'feed_tokens': _feed_tokens,
-            'token_expiry': _token_expiry
-        }
-        with open(TOKEN_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
-    except Exception as e:
-        logger.error(f"Error saving tokens: {e}")
+    """Save tokens to file storage, replacing the file atomically"""
+    global _dirty, _save_timer
+    
+    with _lock:
+        if _save_timer is not None:
+            _save_timer.cancel()
+            _save_timer = None
+        _dirty = False
+        
+        try:
+            data = {
+                'auth_tokens': _auth_tokens,
+                'feed_tokens': _feed_tokens,
+                'token_expiry': {
+                    user_id: datetime.fromtimestamp(expiry).isoformat()
+                    for user_id, expiry in _token_expiry.items()
+                }
+            }
+            tmp_file = TOKEN_FILE + '.tmp'
+            with open(tmp_file, 'wb') as f:
+                f.write(_dumps(data))
+            os.replace(tmp_file, TOKEN_FILE)
+        except Exception as e:
+            logger.error(f"Error saving tokens: {e}")
+
+def _schedule_save():
+    """Mark tokens dirty and flush them after SAVE_DEBOUNCE_SECONDS"""
+    global _dirty, _save_timer
+    
+    with _lock:
+        _dirty = True
+        if _save_timer is None:
+            _save_timer = threading.Timer(SAVE_DEBOUNCE_SECONDS, _flush_tokens)
+            _save_timer.daemon = True
+            _save_timer.start()
+
+def _flush_tokens():
+    """Write pending token changes to disk, if any"""
+    with _lock:
+        if _dirty:
+            _save_tokens()
+
+def add_token_listener(callback):
+    """
+    Register a callback invoked with the user_id whenever tokens are stored or cleared
+    
+    Args:
+        callback: Callable taking a single user_id argument
+    """
+    _token_listeners.append(callback)
+
+def _notify_token_change(user_id: str):
+    """Inform registered listeners that tokens for user_id changed"""
+    for callback in _token_listeners:
+        try:
+            callback(user_id)
+        except Exception as e:
+            logger.error(f"Error in token listener: {e}")
+
+def get_token_expiry(user_id: str = None) -> float:
+    """
+    Get the expiry time of the auth token for user
+    
+    Args:
+        user_id: User identifier (optional, defaults to 'default')
+        
+    Returns:
+        float: Expiry as epoch seconds or None
+    """
+    if user_id is None:
+        user_id = 'default'
+    
+    if not _loaded:
+        _load_tokens()
+    
+    return _token_expiry.get(user_id)
 
 def get_auth_token(user_id: str = None) -> str:
     """
@@ -74,12 +186,30 @@ def get_auth_token(user_id: str = None) -> str:
     if user_id is None:
         user_id = 'default'
     
-    # Load tokens from file if not in memory
-    if not _auth_tokens:
+    # Load tokens from file if not loaded yet
+    if not _loaded:
         _load_tokens()
     
     return _auth_tokens.get(user_id)
 
+def get_auth_token_preview(user_id: str = None) -> str:
+    """
+    Get a truncated auth token for display
+    
+    Args:
+        user_id: User identifier (optional, defaults to 'default')
+        
+    Returns:
+        str: First characters of the auth token followed by '...', or None
+    """
+    if user_id is None:
+        user_id = 'default'
+    
+    if not _loaded:
+        _load_tokens()
+    
+    return _auth_token_previews.get(user_id)
+
 def store_auth_token(user_id: str, auth_token: str, expires_hours: int = 24):
     """
     Store authentication token for user
@@ -89,10 +219,13 @@ def store_auth_token(user_id: str, auth_token: str, expires_hours: int = 24):
         auth_token: Authentication token
         expires_hours: Token expiry in hours (default 24)
     """
-    _auth_tokens[user_id] = auth_token
-    _token_expiry[user_id] = (datetime.now() + timedelta(hours=expires_hours)).isoformat()
-    _save_tokens()
+    with _lock:
+        _auth_tokens[user_id] = auth_token
+        _auth_token_previews[user_id] = _preview(auth_token)
+        _token_expiry[user_id] = time.time() + expires_hours * 3600
+    _schedule_save()
     logger.info(f"Stored auth token for user {user_id} (expires in {expires_hours} hours)")
+    _notify_token_change(user_id)
 
 def get_feed_token(user_id: str = None) -> str:
     """
@@ -107,8 +240,8 @@ def get_feed_token(user_id: str = None) -> str:
     if user_id is None:
         user_id = 'default'
     
-    # Load tokens from file if not in memory
-    if not _feed_tokens:
+    # Load tokens from file if not loaded yet
+    if not _loaded:
         _load_tokens()
     
     return _feed_tokens.get(user_id)
@@ -121,9 +254,11 @@ def store_feed_token(user_id: str, feed_token: str):
         user_id: User identifier
         feed_token: Feed token
     """
-    _feed_tokens[user_id] = feed_token
-    _save_tokens()
+    with _lock:
+        _feed_tokens[user_id] = feed_token
+    _schedule_save()
     logger.info(f"Stored feed token for user {user_id}")
+    _notify_token_change(user_id)
 
 def clear_tokens(user_id: str):
     """
@@ -132,11 +267,32 @@ def clear_tokens(user_id: str):
     Args:
         user_id: User identifier
     """
-    _auth_tokens.pop(user_id, None)
-    _feed_tokens.pop(user_id, None)
-    _token_expiry.pop(user_id, None)
-    _save_tokens()
+    with _lock:
+        _auth_tokens.pop(user_id, None)
+        _feed_tokens.pop(user_id, None)
+        _token_expiry.pop(user_id, None)
+        _auth_token_previews.pop(user_id, None)
+    _schedule_save()
     logger.info(f"Cleared tokens for user {user_id}")
+    _notify_token_change(user_id)
+
+def get_any_user_tokens() -> tuple:
+    """
+    Get the first user with both an auth and a feed token
+    
+    Returns:
+        tuple: (user_id, auth_token, feed_token), or (None, None, None) if none stored
+    """
+    if not _loaded:
+        _load_tokens()
+    
+    with _lock:
+        for user_id, auth_token in _auth_tokens.items():
+            feed_token = _feed_tokens.get(user_id)
+            if auth_token and feed_token:
+                return user_id, auth_token, feed_token
+    
+    return None, None, None
 
 def get_stored_auth_token() -> str:
     """
@@ -156,9 +312,17 @@ def store_tokens(auth_token: str, feed_token: str, user_id: str = 'default'):
         feed_token: Feed token
         user_id: User identifier (defaults to 'default')
     """
-    store_auth_token(user_id, auth_token)
-    store_feed_token(user_id, feed_token)
-    logger.info(f"Stored both tokens for user {user_id}")
+    with _lock:
+        _auth_tokens[user_id] = auth_token
+        _auth_token_previews[user_id] = _preview(auth_token)
+        _feed_tokens[user_id] = feed_token
+        _token_expiry[user_id] = time.time() + 24 * 3600
+    _save_tokens()
+    logger.info(f"Stored auth and feed tokens for user {user_id} (expires in 24 hours)")
+    _notify_token_change(user_id)
 
 # Load tokens on module import
 _load_tokens()
+
+# Make sure debounced writes are not lost on interpreter exit
+atexit.register(_flush_tokens)
@@ -1,53 +1,80 @@
 """
 Symbol token database model for compatibility with existing code.
 Simplified version for the real-time price system.
+
+SQLAlchemy is only imported, and the in-memory database only created, the
+first time one of the module attributes (SymToken, Base, engine, Session)
+is accessed.
 """
-from sqlalchemy import Column, Integer, String, Float, create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-
-Base = declarative_base()
-
-class SymToken(Base):
-    """Symbol token model"""
-    __tablename__ = 'symtoken'
-    
-    id = Column(Integer, primary_key=True)
-    symbol = Column(String, nullable=False, index=True)
-    brsymbol = Column(String, nullable=False, index=True)
-    name = Column(String)
-    exchange = Column(String, index=True)
-    brexchange = Column(String, index=True)
-    token = Column(String, index=True)
-    expiry = Column(String)
-    strike = Column(Float)
-    lotsize = Column(Integer)
-    instrumenttype = Column(String)
-    tick_size = Column(Float)
-    
-    # Mock query property for compatibility
-    query = None
-
-# Mock database setup for compatibility
-engine = None
-Session = None
+
+# Declarative base and SymToken model, populated on first use
+_models = {}
+
+
+def _define_models():
+    """Define the declarative base and SymToken model"""
+    from sqlalchemy import Column, Integer, String, Float
+    from sqlalchemy.ext.declarative import declarative_base
+
+    Base = declarative_base()
+
+    class SymToken(Base):
+        """Symbol token model"""
+        __tablename__ = 'symtoken'
+
+        id = Column(Integer, primary_key=True)
+        symbol = Column(String, nullable=False, index=True)
+        brsymbol = Column(String, nullable=False, index=True)
+        name = Column(String)
+        exchange = Column(String, index=True)
+        brexchange = Column(String, index=True)
+        token = Column(String, index=True)
+        expiry = Column(String)
+        strike = Column(Float)
+        lotsize = Column(Integer)
+        instrumenttype = Column(String)
+        tick_size = Column(Float)
+
+        # Mock query property for compatibility
+        query = None
+
+    _models['Base'] = Base
+    _models['SymToken'] = SymToken
+
 
 def init_mock_db():
     """Initialize mock database for testing"""
     global engine, Session
     try:
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+
+        if not _models:
+            _define_models()
+        Base = _models['Base']
+        SymToken = _models['SymToken']
+
         # Use SQLite in-memory database for compatibility
         engine = create_engine('sqlite:///:memory:', echo=False)
         Base.metadata.create_all(engine)
         Session = sessionmaker(bind=engine)
-        
+
         # Set up mock query property
         session = Session()
         SymToken.query = session.query(SymToken)
-        
+
         return True
     except Exception:
         return False
 
-# Initialize mock database
-init_mock_db()
+
+def __getattr__(name):
+    """Lazily initialize the mock database on first access to the model"""
+    if name in ('SymToken', 'Base', 'engine', 'Session'):
+        if 'engine' not in globals():
+            init_mock_db()
+        if name in _models:
+            return _models[name]
+        if name in globals():
+            return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
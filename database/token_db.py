@@ -2,49 +2,67 @@
 Token database functions for Angel broker integration.
 Simplified mock implementation for the real-time price system.
 """
-from cachetools import TTLCache
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
 from utils.logging import get_logger
 
 logger = get_logger(__name__)
 
-# Define a cache for the tokens, symbols with a max size and a 3600-second TTL
-token_cache = TTLCache(maxsize=1024, ttl=3600)
+# Size of the per-function lookup caches
+LOOKUP_CACHE_SIZE = 4096
+
+@dataclass(frozen=True, slots=True)
+class _TokInfo:
+    """Broker token details for a symbol"""
+    token: str
+    brsymbol: str
+    brexchange: str
 
 # Mock token data for testing - in production this would come from a proper database
-_mock_tokens = {
-    ("RELIANCE", "NSE"): {"token": "2885", "brsymbol": "RELIANCE", "brexchange": "NSE"},
-    ("TCS", "NSE"): {"token": "11536", "brsymbol": "TCS", "brexchange": "NSE"},
-    ("INFY", "NSE"): {"token": "9220", "brsymbol": "INFY", "brexchange": "NSE"},
-    ("ICICIBANK", "NSE"): {"token": "4963", "brsymbol": "ICICIBANK", "brexchange": "NSE"},
-    ("SBIN", "NSE"): {"token": "3045", "brsymbol": "SBIN", "brexchange": "NSE"},
-    ("NIFTY", "NSE_INDEX"): {"token": "99926000", "brsymbol": "NIFTY 50", "brexchange": "NSE"},
-    ("SENSEX", "BSE_INDEX"): {"token": "1", "brsymbol": "SENSEX", "brexchange": "BSE"},
-}
+_mock_tokens = {}
 
-def get_token(symbol, exchange):
-    """
-    Retrieves a token for a given symbol and exchange, utilizing a cache to improve performance.
-    """
-    cache_key = f"{symbol}-{exchange}"
-    # Attempt to retrieve from cache
-    if cache_key in token_cache:
-        return token_cache[cache_key]
-    else:
-        # Query mock database if not in cache
-        token = get_token_dbquery(symbol, exchange)
-        # Cache the result for future requests
-        if token is not None:
-            token_cache[cache_key] = token
-        return token
+# Reverse index (token, exchange) -> symbol, keyed by both the exchange and broker exchange
+_token_to_symbol = {}
+
+# Callbacks run after the lookup caches are cleared, for modules that cache on top of them
+_cache_listeners = []
+
+def _store_token(symbol, exchange, token, brsymbol, brexchange):
+    """Store a token entry with interned strings and update the reverse index"""
+    symbol, exchange = sys.intern(symbol), sys.intern(exchange)
+    info = _TokInfo(sys.intern(token), sys.intern(brsymbol), sys.intern(brexchange))
+    
+    previous = _mock_tokens.get((symbol, exchange))
+    if previous:
+        for key in ((previous.token, exchange), (previous.token, previous.brexchange)):
+            if _token_to_symbol.get(key) == symbol:
+                del _token_to_symbol[key]
+    
+    _mock_tokens[(symbol, exchange)] = info
+    _token_to_symbol.setdefault((info.token, exchange), symbol)
+    _token_to_symbol.setdefault((info.token, info.brexchange), symbol)
+
+for _entry in (
+    ("RELIANCE", "NSE", "2885", "RELIANCE", "NSE"),
+    ("TCS", "NSE", "11536", "TCS", "NSE"),
+    ("INFY", "NSE", "9220", "INFY", "NSE"),
+    ("ICICIBANK", "NSE", "4963", "ICICIBANK", "NSE"),
+    ("SBIN", "NSE", "3045", "SBIN", "NSE"),
+    ("NIFTY", "NSE_INDEX", "99926000", "NIFTY 50", "NSE"),
+    ("SENSEX", "BSE_INDEX", "1", "SENSEX", "BSE"),
+):
+    _store_token(*_entry)
 
-def get_token_dbquery(symbol, exchange):
+@lru_cache(maxsize=LOOKUP_CACHE_SIZE)
+def get_token(symbol, exchange):
     """
-    Queries the mock database for a token by symbol and exchange.
+    Retrieves a token by symbol and exchange from the mock database, memoized with lru_cache.
     """
     try:
         mock_data = _mock_tokens.get((symbol, exchange))
         if mock_data:
-            return mock_data["token"]
+            return mock_data.token
         else:
             logger.warning(f"Token not found for {symbol}.{exchange}")
             return None
@@ -52,55 +70,41 @@ def get_token_dbquery(symbol, exchange):
         logger.error(f"Error while querying the database: {e}")
         return None
 
+@lru_cache(maxsize=LOOKUP_CACHE_SIZE)
 def get_symbol(token, exchange):
     """
-    Retrieves a symbol for a given token and exchange, utilizing a cache to improve performance.
-    """
-    cache_key = f"{token}-{exchange}"
-    # Attempt to retrieve from cache
-    if cache_key in token_cache:
-        return token_cache[cache_key]
-    else:
-        # Query database if not in cache
-        symbol = get_symbol_dbquery(token, exchange)
-        # Cache the result for future requests
-        if symbol is not None:
-            token_cache[cache_key] = symbol
-        return symbol
-
-def get_symbol_dbquery(token, exchange):
-    """
-    Queries the mock database for a symbol by token and exchange.
+    Retrieves a symbol by token and exchange from the mock database, memoized with lru_cache.
     """
     try:
-        for (symbol, exch), data in _mock_tokens.items():
-            if data["token"] == token and (exch == exchange or data["brexchange"] == exchange):
-                return symbol
+        symbol = _token_to_symbol.get((token, exchange))
+        if symbol:
+            return symbol
         logger.warning(f"Symbol not found for token {token}.{exchange}")
         return None
     except Exception as e:
         logger.error(f"Error while querying the database: {e}")
         return None
 
-def get_oa_symbol(symbol, exchange):
+def get_symbol_row(symbol, exchange):
     """
-    Retrieves a symbol for a given token and exchange, utilizing a cache to improve performance.
+    Retrieves token, broker symbol and broker exchange for a symbol in one lookup.
+    
+    Args:
+        symbol: Trading symbol
+        exchange: Exchange code
+        
+    Returns:
+        tuple: (token, brsymbol, brexchange), or None if the symbol is unknown
     """
-    cache_key = f"oa{symbol}-{exchange}"
-    # Attempt to retrieve from cache
-    if cache_key in token_cache:
-        return token_cache[cache_key]
-    else:
-        # Query database if not in cache
-        oasymbol = get_oa_symbol_dbquery(symbol, exchange)
-        # Cache the result for future requests
-        if oasymbol is not None:
-            token_cache[cache_key] = oasymbol
-        return oasymbol
+    info = _mock_tokens.get((symbol, exchange))
+    if info is None:
+        return None
+    return info.token, info.brsymbol, info.brexchange
 
-def get_oa_symbol_dbquery(symbol, exchange):
+@lru_cache(maxsize=LOOKUP_CACHE_SIZE)
+def get_oa_symbol(symbol, exchange):
     """
-    Queries the mock database for a symbol by token and exchange.
+    Retrieves a symbol by token and exchange from the mock database, memoized with lru_cache.
     """
     try:
         # For mock implementation, just return the symbol
@@ -119,30 +123,15 @@ def get_symbol_count():
         logger.error(f"Error while counting symbols: {e}")
         return 0
 
+@lru_cache(maxsize=LOOKUP_CACHE_SIZE)
 def get_br_symbol(symbol, exchange):
     """
-    Retrieves a broker symbol for a given symbol and exchange, utilizing a cache to improve performance.
-    """
-    cache_key = f"br{symbol}-{exchange}"
-    # Attempt to retrieve from cache
-    if cache_key in token_cache:
-        return token_cache[cache_key]
-    else:
-        # Query database if not in cache
-        brsymbol = get_br_symbol_dbquery(symbol, exchange)
-        # Cache the result for future requests
-        if brsymbol is not None:
-            token_cache[cache_key] = brsymbol
-        return brsymbol
-
-def get_br_symbol_dbquery(symbol, exchange):
-    """
-    Queries the mock database for a broker symbol by symbol and exchange.
+    Retrieves a broker symbol by symbol and exchange from the mock database, memoized with lru_cache.
     """
     try:
         mock_data = _mock_tokens.get((symbol, exchange))
         if mock_data:
-            return mock_data["brsymbol"]
+            return mock_data.brsymbol
         else:
             logger.warning(f"Broker symbol not found for {symbol}.{exchange}")
             return symbol  # Fallback to original symbol
@@ -150,30 +139,15 @@ def get_br_symbol_dbquery(symbol, exchange):
         logger.error(f"Error while querying the database: {e}")
         return symbol
 
+@lru_cache(maxsize=LOOKUP_CACHE_SIZE)
 def get_brexchange(symbol, exchange):
     """
-    Retrieves the broker exchange for a given symbol and exchange, utilizing a cache to improve performance.
-    """
-    cache_key = f"brex-{symbol}-{exchange}"
-    # Attempt to retrieve from cache
-    if cache_key in token_cache:
-        return token_cache[cache_key]
-    else:
-        # Query database if not in cache
-        brexchange = get_brexchange_dbquery(symbol, exchange)
-        # Cache the result for future requests
-        if brexchange is not None:
-            token_cache[cache_key] = brexchange
-        return brexchange
-
-def get_brexchange_dbquery(symbol, exchange):
-    """
-    Queries the mock database for a broker exchange by symbol and exchange.
+    Retrieves a broker exchange by symbol and exchange from the mock database, memoized with lru_cache.
     """
     try:
         mock_data = _mock_tokens.get((symbol, exchange))
         if mock_data:
-            return mock_data["brexchange"]
+            return mock_data.brexchange
         else:
             logger.warning(f"Broker exchange not found for {symbol}.{exchange}")
             return exchange  # Fallback to original exchange
@@ -181,6 +155,27 @@ def get_brexchange_dbquery(symbol, exchange):
         logger.error(f"Error while querying the database: {e}")
         return exchange
 
+def clear_lookup_caches():
+    """
+    Invalidate the cached lookups after the token data changes.
+    """
+    for lookup in (get_token, get_symbol, get_oa_symbol, get_br_symbol, get_brexchange):
+        lookup.cache_clear()
+    for callback in _cache_listeners:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Error in lookup cache listener: {e}")
+
+def add_cache_listener(callback):
+    """
+    Register a callback invoked with no arguments whenever the lookup caches are cleared
+    
+    Args:
+        callback: Callable taking no arguments
+    """
+    _cache_listeners.append(callback)
+
 def add_mock_token(symbol: str, exchange: str, token: str, brsymbol: str = None, brexchange: str = None):
     """
     Add a mock token for testing purposes
@@ -192,9 +187,6 @@ def add_mock_token(symbol: str, exchange: str, token: str, brsymbol: str = None,
         brsymbol: Broker symbol (defaults to symbol)
         brexchange: Broker exchange (defaults to exchange)
     """
-    _mock_tokens[(symbol, exchange)] = {
-        "token": token,
-        "brsymbol": brsymbol or symbol,
-        "brexchange": brexchange or exchange
-    }
+    _store_token(symbol, exchange, token, brsymbol or symbol, brexchange or exchange)
+    clear_lookup_caches()
     logger.info(f"Added mock token for {symbol}.{exchange}: {token}")
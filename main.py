@@ -3,7 +3,6 @@ Main entry point for the Real-time Price System.
 Starts the FastAPI server with integrated Angel broker streaming.
 """
 import asyncio
-import os
 import sys
 from pathlib import Path
 
@@ -11,10 +10,21 @@ from pathlib import Path
 current_dir = Path(__file__).parent
 sys.path.insert(0, str(current_dir))
 
-import uvicorn
-from realtime_prices.api import app
+from config import settings
 from utils.logging import get_logger, log_startup_banner
 
+try:
+    import uvloop  # noqa: F401 - only checked for availability, uvicorn installs it
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
+try:
+    import httptools  # noqa: F401 - only checked for availability, uvicorn installs it
+    HTTPTOOLS_AVAILABLE = True
+except ImportError:
+    HTTPTOOLS_AVAILABLE = False
+
 logger = get_logger(__name__)
 
 
@@ -22,10 +32,23 @@ def main():
     """Main function to start the real-time price system"""
     try:
         # Configuration
-        host = os.getenv("HOST", "0.0.0.0")
-        port = int(os.getenv("PORT", "8000"))
-        log_level = os.getenv("LOG_LEVEL", "info").lower()
-        reload = os.getenv("RELOAD", "false").lower() == "true"
+        host = settings.HOST
+        port = settings.PORT
+        log_level = settings.LOG_LEVEL.lower()
+        reload = settings.RELOAD
+        workers = settings.WORKERS
+        if workers > 1:
+            # Each worker would open the DuckDB file (single-writer lock) and keep its
+            # own streamer and WebSocket state, so prices are not shared between them
+            logger.warning(
+                f"WEB_CONCURRENCY={workers} is not supported yet: price state is per-process "
+                "and DuckDB allows one writer. Starting a single worker."
+            )
+            workers = 1
+        # uvloop's libuv-based event loop speeds up the WebSocket send/recv path
+        loop = "uvloop" if UVLOOP_AVAILABLE else "asyncio"
+        # httptools' C parser handles the REST requests and WebSocket upgrades
+        http = "httptools" if HTTPTOOLS_AVAILABLE else "h11"
         
         # Startup banner
         server_url = f"http://{host}:{port}"
@@ -41,6 +64,8 @@ def main():
         logger.info("🗄️  DuckDB Database: Initialized")
         logger.info("🔌 WebSocket Streaming: Available")
         logger.info("📡 REST API: Available")
+        logger.info(f"🔁 Event Loop: {loop}")
+        logger.info(f"🌐 HTTP Parser: {http}")
         logger.info("=" * 60)
         logger.info(f"📖 API Documentation: {server_url}/docs")
         logger.info(f"🔍 ReDoc Documentation: {server_url}/redoc")
@@ -52,13 +77,21 @@ def main():
         logger.info(f"   • Market Updates: ws://{host}:{port}/ws/market")
         logger.info("=" * 60)
         
-        # Start server
+        # Start server. uvicorn imports the app from the string path itself,
+        # so the FastAPI/DuckDB/broker stack is not loaded until here.
+        import uvicorn
         uvicorn.run(
             "realtime_prices.api:app",
             host=host,
             port=port,
             log_level=log_level,
             reload=reload,
+            loop=loop,
+            http=http,
+            workers=workers,
+            # Batched price frames and market status repeat the same keys and
+            # symbol names, so permessage-deflate shrinks them well
+            ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE,
             access_log=True
         )
         
@@ -2,32 +2,89 @@
 FastAPI application for real-time price system.
 Provides REST endpoints and WebSocket connections for live price data.
 """
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, BackgroundTasks, Depends
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, BackgroundTasks, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set, Callable, Awaitable
+from collections import defaultdict, OrderedDict
 import asyncio
+import hashlib
+import heapq
 import json
 import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
+from functools import lru_cache
 import uvicorn
 
 from realtime_prices.database import get_price_database, PriceDatabase
 from realtime_prices.streamer import get_price_streamer, StreamingMode, SymbolConfig
 from broker.angel.utils.auth_helper import auto_authenticate, refresh_authentication, get_authentication_status
+from database.auth_db import add_token_listener
+from utils.httpx_client import cleanup_async_httpx_client
 from utils.logging import get_logger
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import ormsgpack
+    ORMSGPACK_AVAILABLE = True
+except ImportError:
+    ORMSGPACK_AVAILABLE = False
+
+# WebSocket subprotocol a client offers to receive MessagePack instead of JSON
+MSGPACK_SUBPROTOCOL = "msgpack"
+
 logger = get_logger(__name__)
 
+
+def _dumps(message: Any) -> bytes:
+    """Serialize a WebSocket message to UTF-8 JSON bytes, preferring orjson"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(message)
+    return json.dumps(message).encode()
+
+
+def _packb(message: Any) -> bytes:
+    """Serialize a WebSocket message to MessagePack bytes"""
+    # Naive datetimes (stream stats) stay naive, matching the orjson output
+    return ormsgpack.packb(message)
+
+
+def _unpackb(data: bytes) -> Any:
+    """Parse a MessagePack client message"""
+    return ormsgpack.unpackb(data)
+
+
+@lru_cache(maxsize=4096)
+def _norm(value: str) -> str:
+    """Upper-case a symbol or exchange code, interned so repeat lookups share one string"""
+    return sys.intern(value.upper())
+
+
+def _loads(data: str) -> Any:
+    """Parse a WebSocket client message, preferring orjson"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Real-time Price API",
     description="Real-time financial data pipeline with Angel broker integration",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse if ORJSON_AVAILABLE else JSONResponse
 )
 
 # Add CORS middleware
@@ -39,6 +96,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger JSON responses such as /history; small price lookups are left as is
+app.add_middleware(GZipMiddleware, minimum_size=512)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -126,50 +186,88 @@ class AuthStatus(BaseModel):
 class WebSocketManager:
     """Manages WebSocket connections for real-time price updates"""
     
+    # Upper bound on symbols kept in latest_prices/last_sent; least recently updated are evicted
+    MAX_TRACKED_SYMBOLS = 10000
+    # Minimum seconds between pushes of the same symbol
+    PUSH_INTERVAL = 0.5
+    # Seconds to keep collecting ticks after the first one so they share a frame
+    BATCH_WINDOW = 0.05
+    
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.subscriptions: Dict[WebSocket, List[str]] = {}  # WebSocket -> [symbols]
-        self.latest_prices: Dict[str, Dict] = {}  # Store latest prices for each symbol
-        self.last_sent: Dict[str, float] = {}  # Track when we last sent data for each symbol
+        self.active_connections: Set[WebSocket] = set()
+        self.subscriptions: Dict[WebSocket, Set[str]] = {}  # WebSocket -> {symbols}
+        self.msgpack_clients: Set[WebSocket] = set()  # Connections that negotiated MessagePack
+        self.market_subscribers: Set[WebSocket] = set()  # /ws/market connections
+        self.subscribers_by_symbol: Dict[str, Set[WebSocket]] = defaultdict(set)  # symbol -> {WebSockets}
+        self.latest_prices: OrderedDict[str, Dict] = OrderedDict()  # Latest price per symbol, in LRU order
+        self.last_sent: OrderedDict[str, float] = OrderedDict()  # Event-loop (monotonic) time each symbol was last sent
+        # (symbol_key, message) pairs published by the streamer, drained by price_pusher_task
+        self.outbound: asyncio.Queue = asyncio.Queue(maxsize=10000)
+        # (next_send_time, symbol_key) for symbols throttled by PUSH_INTERVAL, earliest first
+        self._due_heap: List[tuple] = []
+        self._scheduled: Set[str] = set()  # symbols currently in _due_heap
     
     async def connect(self, websocket: WebSocket):
-        """Accept new WebSocket connection"""
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        self.subscriptions[websocket] = []
+        """Accept new WebSocket connection, using MessagePack if the client offers it"""
+        if ORMSGPACK_AVAILABLE and MSGPACK_SUBPROTOCOL in websocket.scope.get('subprotocols', []):
+            await websocket.accept(subprotocol=MSGPACK_SUBPROTOCOL)
+            self.msgpack_clients.add(websocket)
+        else:
+            await websocket.accept()
+        self.active_connections.add(websocket)
+        self.subscriptions[websocket] = set()
         logger.info(f"WebSocket connected. Total connections: {len(self.active_connections)}")
     
     def disconnect(self, websocket: WebSocket):
         """Remove WebSocket connection"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        self.active_connections.discard(websocket)
         if websocket in self.subscriptions:
-            del self.subscriptions[websocket]
+            for symbol in self.subscriptions.pop(websocket):
+                self._remove_subscriber(symbol, websocket)
+        self.msgpack_clients.discard(websocket)
+        self.market_subscribers.discard(websocket)
         logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
     
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        """Send message to specific WebSocket"""
+    def is_msgpack(self, websocket: WebSocket) -> bool:
+        """Whether the connection negotiated MessagePack instead of JSON"""
+        return websocket in self.msgpack_clients
+    
+    async def send_personal_message(self, message: dict, websocket: WebSocket):
+        """Send message to specific WebSocket in its negotiated wire format"""
         try:
-            await websocket.send_text(message)
+            payload = _packb(message) if websocket in self.msgpack_clients else _dumps(message)
+            await websocket.send_bytes(payload)
         except Exception as e:
             logger.error(f"Error sending message to WebSocket: {e}")
             self.disconnect(websocket)
     
-    async def broadcast(self, message: str, symbol_filter: Optional[str] = None):
+    async def broadcast(self, message: dict, symbol_filter: Optional[str] = None):
         """Broadcast message to all or filtered connections"""
+        # With a symbol filter only that symbol's subscribers need to be visited
+        if symbol_filter:
+            targets = list(self.subscribers_by_symbol.get(symbol_filter, ()))
+        else:
+            targets = list(self.active_connections)
+        
+        await self.send_to_all(targets, message)
+    
+    async def send_to_all(self, targets: List[WebSocket], message: dict):
+        """Send one message to the given connections, dropping any that fail"""
         disconnected = []
         
-        for websocket in self.active_connections:
-            try:
-                # Apply symbol filter if specified
-                if symbol_filter:
-                    subscribed_symbols = self.subscriptions.get(websocket, [])
-                    if symbol_filter not in subscribed_symbols:
-                        continue
-                
-                await websocket.send_text(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting to WebSocket: {e}")
+        # Encode at most once per wire format, and only for formats some target uses
+        payload = _dumps(message)
+        packed = _packb(message) if not self.msgpack_clients.isdisjoint(targets) else None
+        
+        # Send concurrently so one slow client doesn't hold up the rest
+        results = await asyncio.gather(
+            *(websocket.send_bytes(packed if websocket in self.msgpack_clients else payload)
+              for websocket in targets),
+            return_exceptions=True
+        )
+        for websocket, result in zip(targets, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error broadcasting to WebSocket: {result}")
                 disconnected.append(websocket)
         
         # Clean up disconnected WebSockets
@@ -179,55 +277,140 @@ class WebSocketManager:
     def subscribe_symbol(self, websocket: WebSocket, symbol: str):
         """Subscribe WebSocket to symbol updates"""
         if websocket not in self.subscriptions:
-            self.subscriptions[websocket] = []
+            self.subscriptions[websocket] = set()
         
         if symbol not in self.subscriptions[websocket]:
-            self.subscriptions[websocket].append(symbol)
+            self.subscriptions[websocket].add(symbol)
+            self.subscribers_by_symbol[symbol].add(websocket)
             logger.info(f"WebSocket subscribed to {symbol}")
     
     def unsubscribe_symbol(self, websocket: WebSocket, symbol: str):
         """Unsubscribe WebSocket from symbol updates"""
         if websocket in self.subscriptions:
             if symbol in self.subscriptions[websocket]:
-                self.subscriptions[websocket].remove(symbol)
+                self.subscriptions[websocket].discard(symbol)
+                self._remove_subscriber(symbol, websocket)
                 logger.info(f"WebSocket unsubscribed from {symbol}")
     
+    def _remove_subscriber(self, symbol: str, websocket: WebSocket):
+        """Drop WebSocket from a symbol's subscriber set, forgetting empty sets"""
+        subscribers = self.subscribers_by_symbol.get(symbol)
+        if subscribers is not None:
+            subscribers.discard(websocket)
+            if not subscribers:
+                del self.subscribers_by_symbol[symbol]
+    
     async def broadcast_symbol_update(self, symbol_key: str, message: dict):
         """Broadcast price update to WebSockets subscribed to a specific symbol"""
         try:
-            message_json = json.dumps(message)
-            await self.broadcast(message_json, symbol_filter=symbol_key)
-            logger.debug(f"Broadcasted update for {symbol_key} to {len(self.active_connections)} connections")
+            await self.broadcast(message, symbol_filter=symbol_key)
+            logger.debug(f"Broadcasted update for {symbol_key} to {len(self.subscribers_by_symbol.get(symbol_key, ()))} connections")
         except Exception as e:
             logger.error(f"Error broadcasting symbol update for {symbol_key}: {e}")
     
-    async def push_latest_prices(self):
-        """Push latest available prices to WebSocket clients"""
+    def publish(self, symbol_key: str, message: dict):
+        """Record the latest price message for a symbol and queue it for push"""
+        self.latest_prices[symbol_key] = message
+        self.latest_prices.move_to_end(symbol_key)
+        while len(self.latest_prices) > self.MAX_TRACKED_SYMBOLS:
+            self.latest_prices.popitem(last=False)
         try:
-            import time
-            current_time = time.time()
+            self.outbound.put_nowait((symbol_key, message))
+        except asyncio.QueueFull:
+            # The pusher is behind; the message is still kept in latest_prices
+            logger.debug(f"Outbound queue full, dropped push for {symbol_key}")
+    
+    def next_due_in(self, now: float) -> Optional[float]:
+        """Seconds until the earliest throttled symbol may be pushed, or None if none are waiting"""
+        if not self._due_heap:
+            return None
+        return max(0.0, self._due_heap[0][0] - now)
+    
+    def collect_due(self, symbol_keys: Set[str], now: float) -> Dict[str, Dict]:
+        """
+        Pick the symbols whose latest price can be pushed now.
+        
+        Symbols sent within PUSH_INTERVAL are put on the due heap instead of being
+        sent, and come back out once their next send time has passed.
+        
+        Args:
+            symbol_keys: Symbols with new prices since the last call
+            now: Current event-loop time
             
-            for symbol_key, price_data in self.latest_prices.items():
-                # Only send if we haven't sent this symbol's data recently (rate limiting)
-                last_sent_time = self.last_sent.get(symbol_key, 0)
-                if current_time - last_sent_time >= 0.5:  # Send at most every 500ms per symbol
-                    message_json = json.dumps(price_data)
-                    
-                    # Send to subscribers of this symbol
-                    sent_count = 0
-                    for websocket in self.active_connections:
-                        try:
-                            subscribed_symbols = self.subscriptions.get(websocket, [])
-                            if symbol_key in subscribed_symbols:
-                                await websocket.send_text(message_json)
-                                sent_count += 1
-                        except Exception as e:
-                            logger.debug(f"Error sending to WebSocket client: {e}")
-                            # Don't remove client here, let the main disconnect handler do it
-                    
-                    if sent_count > 0:
-                        self.last_sent[symbol_key] = current_time
-                        logger.debug(f"Pushed {symbol_key} price update to {sent_count} clients")
+        Returns:
+            Dict of symbol_key -> latest price message to push
+        """
+        due: Dict[str, Dict] = {}
+        
+        for symbol_key in symbol_keys:
+            next_send = self.last_sent.get(symbol_key, float('-inf')) + self.PUSH_INTERVAL
+            if next_send <= now:
+                if symbol_key in self.latest_prices:
+                    due[symbol_key] = self.latest_prices[symbol_key]
+            elif symbol_key not in self._scheduled:
+                heapq.heappush(self._due_heap, (next_send, symbol_key))
+                self._scheduled.add(symbol_key)
+        
+        while self._due_heap and self._due_heap[0][0] <= now:
+            _, symbol_key = heapq.heappop(self._due_heap)
+            self._scheduled.discard(symbol_key)
+            if symbol_key in self.latest_prices:
+                due[symbol_key] = self.latest_prices[symbol_key]
+        
+        return due
+    
+    async def push_latest_prices(self, due: Dict[str, Dict]):
+        """Push the given symbol prices to WebSocket clients, one batched frame per client"""
+        try:
+            current_time = asyncio.get_running_loop().time()
+            
+            # Group due symbols by client via the reverse index, encoding each subscribed
+            # symbol once so per-client frames are joined from shared fragments
+            symbols_by_client: Dict[WebSocket, List[str]] = {}
+            encoded: Dict[str, bytes] = {}
+            for symbol_key, price_data in due.items():
+                subscribers = self.subscribers_by_symbol.get(symbol_key)
+                if not subscribers:
+                    continue
+                # JSON fragments for JSON clients; MessagePack frames are packed whole below
+                encoded[symbol_key] = _dumps(price_data)
+                for websocket in subscribers:
+                    symbols_by_client.setdefault(websocket, []).append(symbol_key)
+            
+            # Clients watching the same symbols (e.g. the default watchlist) share one frame
+            frames: Dict[tuple, bytes] = {}
+            
+            sent_symbols = set()
+            dead: List[WebSocket] = []
+            for websocket, symbol_keys in symbols_by_client.items():
+                try:
+                    is_msgpack = websocket in self.msgpack_clients
+                    frame_key = (is_msgpack, tuple(symbol_keys))
+                    frame = frames.get(frame_key)
+                    if frame is None:
+                        if is_msgpack:
+                            frame = _packb({'type': 'batch', 'updates': [due[symbol_key] for symbol_key in symbol_keys]})
+                        else:
+                            updates = b','.join([encoded[symbol_key] for symbol_key in symbol_keys])
+                            frame = b'{"type":"batch","updates":[' + updates + b']}'
+                        frames[frame_key] = frame
+                    await websocket.send_bytes(frame)
+                    sent_symbols.update(symbol_keys)
+                except Exception as e:
+                    logger.debug(f"Error sending to WebSocket client: {e}")
+                    dead.append(websocket)
+            
+            # Drop failed clients now so they aren't retried on every tick
+            for websocket in dead:
+                self.disconnect(websocket)
+            
+            for symbol_key in sent_symbols:
+                self.last_sent[symbol_key] = current_time
+                self.last_sent.move_to_end(symbol_key)
+            while len(self.last_sent) > self.MAX_TRACKED_SYMBOLS:
+                self.last_sent.popitem(last=False)
+            if sent_symbols:
+                logger.debug(f"Pushed {len(sent_symbols)} symbol updates in batched frames")
                         
         except Exception as e:
             logger.error(f"Error pushing latest prices: {e}")
@@ -238,22 +421,78 @@ manager = WebSocketManager()
 
 # Background task to push latest prices
 async def price_pusher_task():
-    """Background task that regularly pushes latest prices to WebSocket clients"""
+    """Background task that pushes prices to WebSocket clients as the streamer publishes them"""
+    loop = asyncio.get_running_loop()
     while True:
         try:
-            if manager.active_connections and manager.latest_prices:
-                await manager.push_latest_prices()
-            await asyncio.sleep(0.5)  # Check every 500ms
+            updated = set()
+            
+            # Wake on the next published tick, or when a throttled symbol becomes due
+            try:
+                symbol_key, _ = await asyncio.wait_for(manager.outbound.get(),
+                                                       manager.next_due_in(loop.time()))
+                updated.add(symbol_key)
+                # Let ticks for other symbols arrive so they go out in the same frame
+                await asyncio.sleep(manager.BATCH_WINDOW)
+            except asyncio.TimeoutError:
+                pass
+            
+            # Drain the burst queued behind it; latest_prices holds the newest tick per symbol
+            while True:
+                try:
+                    symbol_key, _ = manager.outbound.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                updated.add(symbol_key)
+            
+            due = manager.collect_due(updated, loop.time())
+            if due and manager.active_connections:
+                await manager.push_latest_prices(due)
         except Exception as e:
             logger.error(f"Error in price pusher task: {e}")
             await asyncio.sleep(1)  # Wait longer on error
 
+# Threads available to run DuckDB queries off the event loop
+DB_EXECUTOR_WORKERS = 8
+
+# How often /ws/market subscribers receive a status update (seconds)
+MARKET_STATUS_INTERVAL = 30
+
+
+async def build_market_status() -> dict:
+    """Build the market_status message sent to /ws/market subscribers"""
+    return {
+        'type': 'market_status',
+        'data': {
+            'database': await get_price_database().aget_market_status(),
+            'streaming': get_price_streamer().get_stats()
+        },
+        'timestamp': datetime.now().isoformat()
+    }
+
+
+# Background task to push market status
+async def market_status_broadcaster():
+    """Background task that builds the market status once per interval and sends it to every subscriber"""
+    while True:
+        try:
+            await asyncio.sleep(MARKET_STATUS_INTERVAL)
+            if manager.market_subscribers:
+                await manager.send_to_all(list(manager.market_subscribers), await build_market_status())
+        except Exception as e:
+            logger.error(f"Error in market status broadcaster: {e}")
+
 # Start background task
 @app.on_event("startup")
 async def startup_event():
     """Start background tasks when the app starts"""
     logger.info("Starting Real-time Price API...")
     
+    # Bound the default executor, which runs the blocking DuckDB queries
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="price-db")
+    )
+    
     # Initialize database
     db = get_price_database()
     logger.info("Database initialized")
@@ -262,6 +501,10 @@ async def startup_event():
     asyncio.create_task(price_pusher_task())
     logger.info("Price pusher background task started")
     
+    # Start market status broadcaster for /ws/market
+    asyncio.create_task(market_status_broadcaster())
+    logger.info("Market status broadcaster started")
+    
     # Set up periodic cleanup
     asyncio.create_task(periodic_cleanup())
     logger.info("Periodic cleanup task started")
@@ -280,6 +523,8 @@ async def shutdown_event():
     except Exception as e:
         logger.debug(f"Error stopping streamer during shutdown: {e}")
     
+    await cleanup_async_httpx_client()
+    
     logger.info("Real-time Price API shutdown complete")
 
 # Dependencies
@@ -291,41 +536,164 @@ def get_streamer():
     """Dependency to get streamer instance"""
     return get_price_streamer()
 
-async def fetch_live_price_from_angel(symbol: str, exchange: str) -> Optional[Dict[str, Any]]:
-    """Fetch live price data directly from Angel broker API"""
-    try:
+# How long a BrokerData client and its auth token are reused for live fetches (seconds)
+BROKER_CACHE_TTL = 300
+
+# (auth_token, BrokerData, expires_at monotonic) shared by live price fetches
+_broker_cache: Optional[tuple] = None
+_broker_lock = asyncio.Lock()
+
+
+def _invalidate_broker_cache(user_id: str = None):
+    """Drop the cached BrokerData client when stored tokens change"""
+    global _broker_cache
+    _broker_cache = None
+
+
+add_token_listener(_invalidate_broker_cache)
+
+
+async def _get_broker_data() -> tuple:
+    """
+    Get a BrokerData client for live fetches, authenticating only when the cache is stale.
+    
+    Returns:
+        tuple: (BrokerData or None, error_message)
+    """
+    global _broker_cache
+    async with _broker_lock:
+        now = time.monotonic()
+        cached = _broker_cache
+        if cached and cached[2] > now:
+            return cached[1], None
+        
         from broker.angel.api.data import BrokerData
-        import time
         
-        # Try auto-authentication first
         auth_token, feed_token, error = auto_authenticate()
-        
         if not auth_token:
+            _broker_cache = None
+            return None, error
+        
+        broker_data = BrokerData(auth_token)
+        _broker_cache = (auth_token, broker_data, now + BROKER_CACHE_TTL)
+        return broker_data, None
+
+
+# How long a fetched live quote is served from memory (seconds)
+LIVE_PRICE_TTL = 1.0
+
+# (symbol, exchange) -> (fetched_at monotonic, result) for recent live quotes
+_live_price_cache: Dict[tuple, tuple] = {}
+# (symbol, exchange) -> Task running the fetch currently in progress
+_live_price_inflight: Dict[tuple, asyncio.Task] = {}
+
+
+async def fetch_live_price_from_angel(symbol: str, exchange: str) -> Optional[Dict[str, Any]]:
+    """
+    Fetch live price data from Angel, sharing recent and in-flight results.
+    
+    Concurrent callers for the same symbol wait on a single upstream request,
+    and a successful quote is reused for LIVE_PRICE_TTL seconds. The request
+    runs as its own task, so a caller that is cancelled (e.g. a client that
+    disconnects) doesn't cancel it for the others.
+    """
+    key = (symbol, exchange)
+    
+    cached = _live_price_cache.get(key)
+    if cached and time.monotonic() - cached[0] < LIVE_PRICE_TTL:
+        return cached[1]
+    
+    task = _live_price_inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_fetch_and_cache_live_price(symbol, exchange))
+        _live_price_inflight[key] = task
+        task.add_done_callback(lambda done: _finish_live_price_fetch(key, done))
+    return await asyncio.shield(task)
+
+
+async def _fetch_and_cache_live_price(symbol: str, exchange: str) -> Optional[Dict[str, Any]]:
+    """Run one upstream fetch and keep a successful quote for LIVE_PRICE_TTL"""
+    result = await _fetch_live_price_from_angel(symbol, exchange)
+    if result:
+        _live_price_cache[(symbol, exchange)] = (time.monotonic(), result)
+    return result
+
+
+def _finish_live_price_fetch(key: tuple, task: asyncio.Task):
+    """Forget a finished fetch so the next miss starts a new one"""
+    if _live_price_inflight.get(key) is task:
+        del _live_price_inflight[key]
+    # Mark any error retrieved so a fetch whose callers all went away doesn't log "never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
+# How long DuckDB reads are reused by the REST endpoints (seconds)
+CURRENT_PRICE_TTL = 1.0
+HISTORY_TTL = 60.0
+# Expired entries are swept once the read cache grows past this many keys
+DB_READ_CACHE_SIZE = 10000
+
+# ('price'|'history', exchange, symbol[, days]) -> (expires_at monotonic, result)
+_db_read_cache: Dict[tuple, tuple] = {}
+
+
+async def _cached_db_read(key: tuple, ttl: float, read: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Return a recent result for key, or await read() and keep it for ttl seconds.
+    
+    Empty results are not cached so a symbol that starts streaming shows up
+    on the next request.
+    """
+    now = time.monotonic()
+    cached = _db_read_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+    
+    result = await read()
+    if result:
+        if len(_db_read_cache) >= DB_READ_CACHE_SIZE:
+            for stale in [k for k, (expires, _) in _db_read_cache.items() if expires <= now]:
+                del _db_read_cache[stale]
+            if len(_db_read_cache) >= DB_READ_CACHE_SIZE:
+                _db_read_cache.clear()
+        _db_read_cache[key] = (now + ttl, result)
+    return result
+
+
+async def _fetch_live_price_from_angel(symbol: str, exchange: str) -> Optional[Dict[str, Any]]:
+    """Fetch live price data directly from Angel broker API"""
+    try:
+        # Reuse the cached authenticated client where possible
+        broker_data, error = await _get_broker_data()
+        
+        if not broker_data:
             # Only log as debug before authentication, not warning
             logger.debug(f"No Angel auth token available for live data fetch: {error}")
             return None
         
-        broker_data = BrokerData(auth_token)
-        
         # Get quote from Angel - using proper Angel API call
-        quote = await asyncio.to_thread(broker_data.get_quotes, symbol, exchange)
+        quote = await broker_data.aget_quotes(symbol, exchange)
         if not quote:
             logger.debug(f"No quote data returned from Angel for {symbol}.{exchange}")
             return None
         
-        # Convert Angel format to our format
+        # Convert Angel format to our format; aget_quotes already returns
+        # floats/ints, so fields are copied without re-converting
+        ltp = quote.get('ltp') or 0
+        now = time.time()
         result = {
             'symbol': symbol,
             'exchange': exchange,
-            'ltp': float(quote.get('ltp', 0)) if quote.get('ltp') else 0,
-            'open': float(quote.get('open', 0)) if quote.get('open') else 0,
-            'high': float(quote.get('high', 0)) if quote.get('high') else 0,
-            'low': float(quote.get('low', 0)) if quote.get('low') else 0,
-            'close': float(quote.get('close', quote.get('ltp', 0))) if quote.get('close') or quote.get('ltp') else 0,
-            'volume': int(quote.get('volume', 0)) if quote.get('volume') else 0,
-            'oi': int(quote.get('oi', 0)) if quote.get('oi') else 0,
-            'last_updated': datetime.now().isoformat(),
-            'timestamp': int(time.time() * 1000)
+            'ltp': ltp,
+            'open': quote.get('open') or 0,
+            'high': quote.get('high') or 0,
+            'low': quote.get('low') or 0,
+            'close': quote.get('close') or ltp,
+            'volume': quote.get('volume') or 0,
+            'oi': quote.get('oi') or 0,
+            'last_updated': datetime.fromtimestamp(now).isoformat(),
+            'timestamp': int(now * 1000)
         }
         
         logger.info(f"📊 Angel API live data for {symbol}.{exchange}: LTP=₹{result['ltp']}")
@@ -359,7 +727,7 @@ async def root():
 async def health_check(db: PriceDatabase = Depends(get_database)):
     """Health check endpoint"""
     try:
-        market_status = db.get_market_status()
+        market_status = await db.aget_market_status()
         return {
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
@@ -371,23 +739,32 @@ async def health_check(db: PriceDatabase = Depends(get_database)):
         raise HTTPException(status_code=503, detail="Service unhealthy")
 
 
-@app.get("/price/{symbol}", response_model=PriceResponse)
+# Served without response_model so the hot path skips Pydantic validation;
+# the model is still listed for the OpenAPI schema
+@app.get(
+    "/price/{symbol}",
+    responses={200: {"model": PriceResponse}}
+)
 async def get_current_price(
     symbol: str, 
     exchange: str = "NSE",
     db: PriceDatabase = Depends(get_database)
 ):
     """Get current price for a symbol"""
+    symbol, exchange = _norm(symbol), _norm(exchange)
     try:
-        result = db.get_current_price(symbol.upper(), exchange.upper())
+        result = await _cached_db_read(
+            ('price', exchange, symbol), CURRENT_PRICE_TTL,
+            lambda: db.aget_current_price(symbol, exchange)
+        )
         
         # If not in database, try to fetch from Angel broker
         if not result:
             try:
-                result = await fetch_live_price_from_angel(symbol.upper(), exchange.upper())
+                result = await fetch_live_price_from_angel(symbol, exchange)
                 if result:
                     # Store in database for future requests
-                    db.upsert_price(symbol.upper(), exchange.upper(), result)
+                    db.upsert_price(symbol, exchange, result)
                     logger.info(f"📊 Fetched and cached live data for {symbol}.{exchange}")
                 else:
                     raise HTTPException(
@@ -406,19 +783,19 @@ async def get_current_price(
         if result.get('open') and result.get('close'):
             change_percent = ((result['close'] - result['open']) / result['open']) * 100
         
-        return PriceResponse(
-            symbol=result['symbol'],
-            exchange=result['exchange'],
-            open=result['open'],
-            high=result['high'],
-            low=result['low'],
-            close=result['close'],
-            ltp=result['ltp'],
-            volume=result['volume'],
-            oi=result['oi'],
-            last_updated=result['last_updated'],
-            change_percent=change_percent
-        )
+        return {
+            'symbol': result['symbol'],
+            'exchange': result['exchange'],
+            'open': result['open'],
+            'high': result['high'],
+            'low': result['low'],
+            'close': result['close'],
+            'ltp': result['ltp'],
+            'volume': result['volume'],
+            'oi': result['oi'],
+            'last_updated': result['last_updated'],
+            'change_percent': change_percent
+        }
         
     except HTTPException:
         raise
@@ -529,7 +906,7 @@ async def get_websocket_debug_data():
             "latest_prices_count": len(manager.latest_prices),
             "latest_prices": {k: v for k, v in list(manager.latest_prices.items())[-5:]},  # Last 5 only
             "subscriptions_count": len(manager.subscriptions),
-            "subscriptions": {i: subs for i, subs in enumerate(list(manager.subscriptions.values())[:3])}  # First 3 only
+            "subscriptions": {i: sorted(subs) for i, subs in enumerate(list(manager.subscriptions.values())[:3])}  # First 3 only
         }
     except Exception as e:
         logger.error(f"Error getting WebSocket debug data: {e}")
@@ -540,8 +917,27 @@ async def get_websocket_debug_data():
 # Historical Data Endpoints
 # ================================
 
-@app.get("/history/{symbol}", response_model=List[HistoricalData])
+def _etag(body: bytes) -> str:
+    """Strong ETag for a response body"""
+    return '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+
+# Body and ETag served for a symbol without history
+_EMPTY_HISTORY = (_etag(b'[]'), b'[]')
+
+
+async def _history_payload(db: PriceDatabase, symbol: str, exchange: str, days: int) -> Optional[tuple]:
+    """Fetch history rows and encode them once as (etag, JSON body), or None if there are none"""
+    rows = await db.aget_price_history(symbol, exchange, days)
+    if not rows:
+        return None
+    body = _dumps(rows)
+    return _etag(body), body
+
+
+@app.get("/history/{symbol}", responses={200: {"model": List[HistoricalData]}})
 async def get_price_history(
+    request: Request,
     symbol: str,
     exchange: str = "NSE",
     days: Optional[int] = 30,
@@ -552,23 +948,18 @@ async def get_price_history(
         if days and (days < 1 or days > 365):
             raise HTTPException(status_code=400, detail="Days must be between 1 and 365")
         
-        results = db.get_price_history(symbol.upper(), exchange.upper(), days or 30)
-        
-        return [
-            HistoricalData(
-                date=row['date'],
-                symbol=row['symbol'],
-                exchange=row['exchange'],
-                open=row['open'],
-                high=row['high'],
-                low=row['low'],
-                close=row['close'],
-                volume=row['volume'],
-                oi=row['oi'],
-                last_updated=row['last_updated']
-            )
-            for row in results
-        ]
+        symbol, exchange, days = _norm(symbol), _norm(exchange), days or 30
+        etag, body = await _cached_db_read(
+            ('history', exchange, symbol, days), HISTORY_TTL,
+            lambda: _history_payload(db, symbol, exchange, days)
+        ) or _EMPTY_HISTORY
+        
+        # Polling clients that already have this version get an empty 304
+        if etag in request.headers.get('if-none-match', ''):
+            return Response(status_code=304, headers={'ETag': etag})
+        
+        # The cached body is already encoded JSON matching HistoricalData
+        return Response(body, media_type="application/json", headers={'ETag': etag})
         
     except HTTPException:
         raise
@@ -577,7 +968,7 @@ async def get_price_history(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-@app.get("/ticks/{symbol}", response_model=List[TickData])
+@app.get("/ticks/{symbol}", responses={200: {"model": List[TickData]}})
 async def get_recent_ticks(
     symbol: str,
     exchange: str = "NSE",
@@ -589,21 +980,10 @@ async def get_recent_ticks(
         if limit and (limit < 1 or limit > 1000):
             raise HTTPException(status_code=400, detail="Limit must be between 1 and 1000")
         
-        results = db.get_recent_ticks(symbol.upper(), exchange.upper(), limit or 100)
-        
-        return [
-            TickData(
-                timestamp=row['timestamp'],
-                symbol=row['symbol'],
-                exchange=row['exchange'],
-                ltp=row['ltp'],
-                volume=row['volume'],
-                oi=row['oi'],
-                bid=row['bid'],
-                ask=row['ask']
-            )
-            for row in results
-        ]
+        results = await db.aget_recent_ticks(_norm(symbol), _norm(exchange), limit or 100)
+        
+        # Rows already match TickData, so encode them directly without a model pass
+        return Response(_dumps(results), media_type="application/json")
         
     except HTTPException:
         raise
@@ -619,7 +999,7 @@ async def get_market_status(
 ):
     """Get overall market status and streaming statistics"""
     try:
-        db_status = db.get_market_status()
+        db_status = await db.aget_market_status()
         streaming_stats = streamer.get_stats()
         
         return MarketStatus(
@@ -690,14 +1070,15 @@ async def add_streaming_symbol(
             "DEPTH": StreamingMode.DEPTH
         }
         
-        mode = mode_map.get(symbol_req.mode.upper(), StreamingMode.QUOTE)
-        streamer.add_symbol(symbol_req.symbol.upper(), symbol_req.exchange.upper(), mode)
+        symbol, exchange, mode_name = _norm(symbol_req.symbol), _norm(symbol_req.exchange), _norm(symbol_req.mode)
+        mode = mode_map.get(mode_name, StreamingMode.QUOTE)
+        streamer.add_symbol(symbol, exchange, mode)
         
         return {
             "message": f"Added {symbol_req.symbol}.{symbol_req.exchange} to streaming",
-            "symbol": symbol_req.symbol.upper(),
-            "exchange": symbol_req.exchange.upper(),
-            "mode": symbol_req.mode.upper()
+            "symbol": symbol,
+            "exchange": exchange,
+            "mode": mode_name
         }
         
     except Exception as e:
@@ -712,12 +1093,13 @@ async def remove_streaming_symbol(
 ):
     """Remove symbol from streaming"""
     try:
-        streamer.remove_symbol(symbol_req.symbol.upper(), symbol_req.exchange.upper())
+        symbol, exchange = _norm(symbol_req.symbol), _norm(symbol_req.exchange)
+        streamer.remove_symbol(symbol, exchange)
         
         return {
             "message": f"Removed {symbol_req.symbol}.{symbol_req.exchange} from streaming",
-            "symbol": symbol_req.symbol.upper(),
-            "exchange": symbol_req.exchange.upper()
+            "symbol": symbol,
+            "exchange": exchange
         }
         
     except Exception as e:
@@ -731,18 +1113,22 @@ async def remove_streaming_symbol(
 async def websocket_endpoint(websocket: WebSocket):
     """Main WebSocket endpoint for real-time price updates"""
     await manager.connect(websocket)
+    is_msgpack = manager.is_msgpack(websocket)
     
     try:
         while True:
             # Wait for client messages
-            data = await websocket.receive_text()
+            if is_msgpack:
+                data = await websocket.receive_bytes()
+            else:
+                data = await websocket.receive_text()
             
             try:
-                message = json.loads(data)
+                message = _unpackb(data) if is_msgpack else _loads(data)
                 
                 if message.get('type') == 'subscribe':
-                    symbol = message.get('symbol', '').upper()
-                    exchange = message.get('exchange', 'NSE').upper()
+                    symbol = _norm(message.get('symbol', ''))
+                    exchange = _norm(message.get('exchange', 'NSE'))
                     symbol_key = f"{exchange}_{symbol}"
                     
                     manager.subscribe_symbol(websocket, symbol_key)
@@ -753,11 +1139,16 @@ async def websocket_endpoint(websocket: WebSocket):
                         'exchange': exchange,
                         'status': 'subscribed'
                     }
-                    await manager.send_personal_message(json.dumps(response), websocket)
+                    await manager.send_personal_message(response, websocket)
+                    
+                    # Prices are pushed on the next tick, so send the cached one straight away
+                    latest = manager.latest_prices.get(symbol_key)
+                    if latest:
+                        await manager.send_personal_message(latest, websocket)
                 
                 elif message.get('type') == 'unsubscribe':
-                    symbol = message.get('symbol', '').upper()
-                    exchange = message.get('exchange', 'NSE').upper()
+                    symbol = _norm(message.get('symbol', ''))
+                    exchange = _norm(message.get('exchange', 'NSE'))
                     symbol_key = f"{exchange}_{symbol}"
                     
                     manager.unsubscribe_symbol(websocket, symbol_key)
@@ -768,21 +1159,22 @@ async def websocket_endpoint(websocket: WebSocket):
                         'exchange': exchange,
                         'status': 'unsubscribed'
                     }
-                    await manager.send_personal_message(json.dumps(response), websocket)
+                    await manager.send_personal_message(response, websocket)
                 
                 elif message.get('type') == 'ping':
                     pong_response = {
                         'type': 'pong',
                         'timestamp': datetime.now().isoformat()
                     }
-                    await manager.send_personal_message(json.dumps(pong_response), websocket)
+                    await manager.send_personal_message(pong_response, websocket)
                 
-            except json.JSONDecodeError:
+            except ValueError:
+                # json/orjson and ormsgpack decode errors are all ValueErrors
                 error_response = {
                     'type': 'error',
-                    'message': 'Invalid JSON format'
+                    'message': 'Invalid MessagePack format' if is_msgpack else 'Invalid JSON format'
                 }
-                await manager.send_personal_message(json.dumps(error_response), websocket)
+                await manager.send_personal_message(error_response, websocket)
             
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -797,33 +1189,16 @@ async def market_websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     
     try:
-        # Send initial market status
-        db = get_price_database()
-        streamer = get_price_streamer()
+        # Send initial market status; periodic updates come from market_status_broadcaster
+        await manager.send_personal_message(await build_market_status(), websocket)
+        manager.market_subscribers.add(websocket)
         
-        initial_status = {
-            'type': 'market_status',
-            'data': {
-                'database': db.get_market_status(),
-                'streaming': streamer.get_stats()
-            },
-            'timestamp': datetime.now().isoformat()
-        }
-        await manager.send_personal_message(json.dumps(initial_status), websocket)
-        
-        # Keep connection alive and send periodic updates
+        # Keep connection open until the client goes away
         while True:
-            await asyncio.sleep(30)  # Send updates every 30 seconds
-            
-            status_update = {
-                'type': 'market_status',
-                'data': {
-                    'database': db.get_market_status(),
-                    'streaming': streamer.get_stats()
-                },
-                'timestamp': datetime.now().isoformat()
-            }
-            await manager.send_personal_message(json.dumps(status_update), websocket)
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                manager.disconnect(websocket)
+                break
             
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -854,7 +1229,7 @@ async def periodic_cleanup():
             await asyncio.sleep(3600)  # Run every hour
             
             db = get_price_database()
-            db.cleanup_old_ticks(days_to_keep=7)
+            await db.acleanup_old_ticks(days_to_keep=7)
             
         except Exception as e:
             logger.error(f"Error in periodic cleanup: {e}")
@@ -866,7 +1241,7 @@ async def test_angel_data(symbol: str, exchange: str = "NSE"):
         logger.info(f"🧪 Testing Angel data fetch for {symbol}.{exchange}")
         
         # Try direct Angel API call
-        result = await fetch_live_price_from_angel(symbol.upper(), exchange.upper())
+        result = await fetch_live_price_from_angel(_norm(symbol), _norm(exchange))
         
         if result:
             logger.info(f"🧪 Test successful - got data: {result}")
@@ -4,7 +4,8 @@ Provides efficient OHLC data storage with upsert capabilities.
 """
 import duckdb
 import asyncio
-from datetime import datetime, date, timezone
+import atexit
+from datetime import datetime, date, timedelta, timezone
 from typing import Optional, List, Dict, Any
 from pathlib import Path
 import threading
@@ -12,6 +13,37 @@ from utils.logging import get_logger
 
 logger = get_logger(__name__)
 
+# Buffered ticks are written to DuckDB at least this often (seconds)
+FLUSH_INTERVAL = 0.25
+# ...or as soon as this many ticks are waiting
+FLUSH_MAX_TICKS = 1000
+# Most ticks one flush batch writes while holding the writer lock
+FLUSH_BATCH_TICKS = 10000
+# Past this many waiting ticks the writer flushes inline instead of buffering more
+MAX_BUFFERED_TICKS = 20 * FLUSH_MAX_TICKS
+# Longest a read waits for the flusher to write the ticks buffered before it (seconds)
+READ_FLUSH_TIMEOUT = 1.0
+
+# Directory, next to the database file, where expired ticks are archived as one Parquet file per day
+TICK_ARCHIVE_DIR = "ticks"
+
+
+def _iso_utc(column: str) -> str:
+    """SQL expression rendering a TIMESTAMPTZ column as an ISO 8601 UTC string"""
+    return f"strftime(timezone('UTC', {column}), '%Y-%m-%dT%H:%M:%S.%f+00:00')"
+
+
+def _price_or(value: Any, fallback: float) -> float:
+    """Price as float, or fallback when missing or non-positive (LTP-mode ticks send 0 for OHLC)"""
+    price = float(value or 0)
+    return price if price > 0 else fallback
+
+
+def _fetch_dicts(cursor: duckdb.DuckDBPyConnection) -> List[Dict[str, Any]]:
+    """Fetch the remaining rows of a query as dicts keyed by column name"""
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
 
 class PriceDatabase:
     """DuckDB-based price database for real-time OHLC data"""
@@ -25,8 +57,34 @@ class PriceDatabase:
         """
         self.db_path = db_path
         self.conn = None
+        # Serializes writers (flush, cleanup, schema); readers use per-thread cursors
         self._lock = threading.RLock()
+        self._local = threading.local()
+        self._cursors: List[duckdb.DuckDBPyConnection] = []
+        
+        # Running count of ticks written today, so market status never scans real_time_ticks
+        self._tick_count_date: Optional[date] = None
+        self._tick_count = 0
+        
+        # Ticks waiting to be written, as tick_staging rows without the seq column.
+        # Guarded by its own lock so the tick path never waits on a DuckDB write.
+        self._tick_buffer: List[tuple] = []
+        self._buffer_lock = threading.Lock()
+        
+        # Ticks ever buffered vs. ticks taken off the buffer and written (or dropped by a
+        # failed flush); reads wait on _flushed until the second catches up with the first
+        self._ticks_buffered = 0
+        self._ticks_flushed = 0
+        self._flushed = threading.Condition()
+        
         self._initialize_database()
+        
+        # Background writer so the tick path only touches memory
+        self._flush_stop = threading.Event()
+        self._flush_now = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="price-db-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
     
     def _initialize_database(self):
         """Initialize database connection and create schema"""
@@ -40,6 +98,7 @@ class PriceDatabase:
             
             # Create schema
             self._create_schema()
+            self._count_ticks_today()
             logger.info(f"Initialized DuckDB database at {self.db_path}")
             
         except Exception as e:
@@ -50,16 +109,19 @@ class PriceDatabase:
         """Create the price table schema with proper indexing"""
         with self._lock:
             try:
+                self.conn.execute("BEGIN TRANSACTION")
+                legacy_tables = self._stash_decimal_tables()
+                
                 # Create main prices table
                 self.conn.execute("""
                     CREATE TABLE IF NOT EXISTS prices (
                         date DATE NOT NULL,
                         symbol VARCHAR(20) NOT NULL,
                         exchange VARCHAR(10) NOT NULL,
-                        open DECIMAL(12,2) NOT NULL DEFAULT 0.00,
-                        high DECIMAL(12,2) NOT NULL DEFAULT 0.00,
-                        low DECIMAL(12,2) NOT NULL DEFAULT 0.00,
-                        close DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+                        open DOUBLE NOT NULL DEFAULT 0,
+                        high DOUBLE NOT NULL DEFAULT 0,
+                        low DOUBLE NOT NULL DEFAULT 0,
+                        close DOUBLE NOT NULL DEFAULT 0,
                         volume BIGINT NOT NULL DEFAULT 0,
                         oi BIGINT NOT NULL DEFAULT 0,
                         last_updated TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
@@ -79,30 +141,49 @@ class PriceDatabase:
                     ON prices(date DESC, symbol, exchange)
                 """)
                 
+                # No index on last_updated: DuckDB turns upserts that change an indexed
+                # column into delete+insert, which resets the columns the upsert leaves
+                # alone and conflicts with concurrent readers
+                self.conn.execute("DROP INDEX IF EXISTS idx_last_updated")
+                
+                # Create sequence for tick IDs
                 self.conn.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_last_updated 
-                    ON prices(last_updated DESC)
+                    CREATE SEQUENCE IF NOT EXISTS tick_id_seq START 1
                 """)
                 
                 # Create real-time ticks table for intraday data
                 self.conn.execute("""
                     CREATE TABLE IF NOT EXISTS real_time_ticks (
-                        id BIGINT PRIMARY KEY,
+                        id BIGINT PRIMARY KEY DEFAULT nextval('tick_id_seq'),
                         timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
                         symbol VARCHAR(20) NOT NULL,
                         exchange VARCHAR(10) NOT NULL,
-                        ltp DECIMAL(12,2) NOT NULL,
+                        ltp DOUBLE NOT NULL,
                         volume BIGINT DEFAULT 0,
                         oi BIGINT DEFAULT 0,
-                        bid DECIMAL(12,2) DEFAULT 0.00,
-                        ask DECIMAL(12,2) DEFAULT 0.00,
+                        bid DOUBLE DEFAULT 0,
+                        ask DOUBLE DEFAULT 0,
                         created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
                     )
                 """)
                 
-                # Create sequence for tick IDs
+                # Per-connection staging area that flush() batches buffered ticks through
                 self.conn.execute("""
-                    CREATE SEQUENCE IF NOT EXISTS tick_id_seq START 1
+                    CREATE TEMP TABLE IF NOT EXISTS tick_staging (
+                        seq INTEGER,
+                        day DATE,
+                        timestamp TIMESTAMP WITH TIME ZONE,
+                        symbol VARCHAR,
+                        exchange VARCHAR,
+                        ltp DOUBLE,
+                        open DOUBLE,
+                        high DOUBLE,
+                        low DOUBLE,
+                        volume BIGINT,
+                        oi BIGINT,
+                        bid DOUBLE,
+                        ask DOUBLE
+                    )
                 """)
                 
                 # Index for real-time ticks
@@ -111,16 +192,58 @@ class PriceDatabase:
                     ON real_time_ticks(symbol, exchange, timestamp DESC)
                 """)
                 
+                # Copy rows from pre-DOUBLE tables into the new schema
+                for table in legacy_tables:
+                    self.conn.execute(f"INSERT INTO {table} SELECT * FROM {table}_legacy")
+                    self.conn.execute(f"DROP TABLE {table}_legacy")
+                
+                self.conn.execute("COMMIT")
                 logger.info("Database schema created successfully")
                 
             except Exception as e:
+                self.conn.execute("ROLLBACK")
                 logger.error(f"Failed to create database schema: {e}")
                 raise
     
+    def _count_ticks_today(self):
+        """Seed the running tick count from the ticks already stored for today"""
+        with self._lock:
+            self._tick_count_date = date.today()
+            self._tick_count = self.conn.execute("""
+                SELECT COUNT(*) 
+                FROM real_time_ticks 
+                WHERE timestamp >= CURRENT_DATE
+            """).fetchone()[0]
+    
+    def _stash_decimal_tables(self) -> List[str]:
+        """
+        Move tables whose price columns are still DECIMAL aside so they are
+        recreated with DOUBLE columns
+        
+        Returns:
+            Names of the tables that were moved; their rows are in {name}_legacy
+        """
+        legacy_tables = [row[0] for row in self.conn.execute("""
+            SELECT DISTINCT table_name
+            FROM information_schema.columns
+            WHERE table_name IN ('prices', 'real_time_ticks') AND data_type LIKE 'DECIMAL%'
+        """).fetchall()]
+        
+        for table in legacy_tables:
+            logger.info(f"Migrating {table} price columns from DECIMAL to DOUBLE")
+            self.conn.execute(f"CREATE TEMP TABLE {table}_legacy AS SELECT * FROM {table}")
+            self.conn.execute(f"DROP TABLE {table}")
+        
+        return legacy_tables
+    
     def upsert_price(self, symbol: str, exchange: str, price_data: Dict[str, Any]) -> bool:
         """
         Update existing or insert new price data for today
         
+        The tick is buffered in memory and written by the background flusher,
+        so many ticks share one round of DuckDB writes. If the flusher falls
+        MAX_BUFFERED_TICKS behind, the caller flushes inline instead.
+        
         Args:
             symbol: Trading symbol
             exchange: Exchange code
@@ -130,83 +253,154 @@ class PriceDatabase:
         Returns:
             bool: True if successful, False otherwise
         """
-        with self._lock:
-            try:
-                today = date.today()
-                current_price = float(price_data.get('ltp', 0))
-                volume = int(price_data.get('volume', 0))
-                oi = int(price_data.get('oi', 0))
-                
-                # Check if record exists for today
-                existing = self.conn.execute("""
-                    SELECT open, high, low, close, volume, oi 
-                    FROM prices 
-                    WHERE date = ? AND symbol = ? AND exchange = ?
-                """, [today, symbol, exchange]).fetchone()
-                
-                if existing:
-                    # Update existing record
-                    old_open, old_high, old_low, old_close, old_volume, old_oi = existing
-                    
-                    new_high = max(float(old_high), current_price)
-                    new_low = min(float(old_low), current_price) if float(old_low) > 0 else current_price
-                    new_volume = max(old_volume, volume)  # Use max volume seen
-                    new_oi = oi if oi > 0 else old_oi  # Use latest OI if available
-                    
-                    self.conn.execute("""
-                        UPDATE prices SET 
-                            high = ?,
-                            low = ?,
-                            close = ?,
-                            volume = ?,
-                            oi = ?,
-                            last_updated = CURRENT_TIMESTAMP
-                        WHERE date = ? AND symbol = ? AND exchange = ?
-                    """, [new_high, new_low, current_price, new_volume, new_oi, today, symbol, exchange])
-                    
-                else:
-                    # Insert new record
-                    open_price = price_data.get('open', current_price)
-                    high_price = price_data.get('high', current_price)
-                    low_price = price_data.get('low', current_price)
-                    
-                    self.conn.execute("""
-                        INSERT INTO prices (date, symbol, exchange, open, high, low, close, volume, oi)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, [today, symbol, exchange, open_price, high_price, low_price, 
-                         current_price, volume, oi])
-                
-                # Also insert real-time tick
-                self._insert_tick(symbol, exchange, price_data)
-                
-                return True
+        try:
+            now = datetime.now(timezone.utc)
+            current_price = float(price_data.get('ltp', 0))
+            tick = (date.today(), now, symbol, exchange, current_price,
+                    _price_or(price_data.get('open'), current_price),
+                    _price_or(price_data.get('high'), current_price),
+                    _price_or(price_data.get('low'), current_price),
+                    int(price_data.get('volume', 0)), int(price_data.get('oi', 0)),
+                    float(price_data.get('bid', 0)), float(price_data.get('ask', 0)))
+        except (TypeError, ValueError) as e:
+            logger.error(f"Failed to upsert price for {symbol}.{exchange}: {e}")
+            return False
+        
+        with self._buffer_lock:
+            self._tick_buffer.append(tick)
+            self._ticks_buffered += 1
+            buffered = len(self._tick_buffer)
+        if buffered >= MAX_BUFFERED_TICKS:
+            self.flush()  # Backpressure: the flusher cannot keep up, so write on this thread
+        elif buffered >= FLUSH_MAX_TICKS:
+            self._flush_now.set()  # Wake the flusher early rather than writing on this thread
+        
+        return True
+    
+    def _flush_loop(self):
+        """Write buffered ticks every FLUSH_INTERVAL until the database is closed"""
+        while not self._flush_stop.is_set():
+            self._flush_now.wait(FLUSH_INTERVAL)
+            self._flush_now.clear()
+            self.flush()
+    
+    def flush(self):
+        """
+        Write the ticks buffered so far to DuckDB and fold them into today's OHLC
+        
+        Ticks are written in batches of at most FLUSH_BATCH_TICKS, releasing the
+        writer lock between batches; ticks buffered after the call are left for
+        the next flush.
+        """
+        with self._buffer_lock:
+            pending = len(self._tick_buffer)
+        
+        while pending > 0:
+            with self._lock:
+                # Take the batch under the writer lock too, so batches reach DuckDB in arrival order
+                with self._buffer_lock:
+                    if not self._tick_buffer or self.conn is None:
+                        return
+                    ticks = self._tick_buffer[:FLUSH_BATCH_TICKS]
+                    del self._tick_buffer[:FLUSH_BATCH_TICKS]
                 
-            except Exception as e:
-                logger.error(f"Failed to upsert price for {symbol}.{exchange}: {e}")
-                return False
+                try:
+                    self._write_ticks(ticks)
+                finally:
+                    with self._flushed:
+                        self._ticks_flushed += len(ticks)
+                        self._flushed.notify_all()
+            pending -= len(ticks)
     
-    def _insert_tick(self, symbol: str, exchange: str, price_data: Dict[str, Any]):
-        """Insert real-time tick data"""
+    def _write_ticks(self, ticks: List[tuple]):
+        """Write one batch of buffered ticks through tick_staging in a single transaction"""
         try:
-            tick_id = self.conn.execute("SELECT nextval('tick_id_seq')").fetchone()[0]
-            
+            self.conn.execute("BEGIN TRANSACTION")
+            # Bind each column as one list and unnest them side by side: a single
+            # bulk insert rather than a round trip per tick
             self.conn.execute("""
-                INSERT INTO real_time_ticks 
-                (id, timestamp, symbol, exchange, ltp, volume, oi, bid, ask)
-                VALUES (?, CURRENT_TIMESTAMP, ?, ?, ?, ?, ?, ?, ?)
-            """, [
-                tick_id,
-                symbol,
-                exchange,
-                float(price_data.get('ltp', 0)),
-                int(price_data.get('volume', 0)),
-                int(price_data.get('oi', 0)),
-                float(price_data.get('bid', 0)),
-                float(price_data.get('ask', 0))
-            ])
+                INSERT INTO tick_staging
+                SELECT generate_subscripts($1::DATE[], 1) - 1,
+                       unnest($1::DATE[]), unnest($2::TIMESTAMPTZ[]),
+                       unnest($3::VARCHAR[]), unnest($4::VARCHAR[]),
+                       unnest($5::DOUBLE[]), unnest($6::DOUBLE[]),
+                       unnest($7::DOUBLE[]), unnest($8::DOUBLE[]),
+                       unnest($9::BIGINT[]), unnest($10::BIGINT[]),
+                       unnest($11::DOUBLE[]), unnest($12::DOUBLE[])
+            """, [list(column) for column in zip(*ticks)])
+            self._merge_prices()
+            self._insert_ticks()
+            self.conn.execute("DELETE FROM tick_staging")
+            self.conn.execute("COMMIT")
             
+            today = date.today()
+            if today != self._tick_count_date:
+                self._tick_count_date, self._tick_count = today, 0
+            self._tick_count += len(ticks)
         except Exception as e:
-            logger.error(f"Failed to insert tick for {symbol}.{exchange}: {e}")
+            self.conn.execute("ROLLBACK")
+            logger.error(f"Failed to flush {len(ticks)} buffered ticks: {e}")
+    
+    def _wait_for_flush(self):
+        """
+        Let the flusher write the ticks buffered before this read, waiting at
+        most READ_FLUSH_TIMEOUT; reads never flush or take the writer lock themselves
+        """
+        with self._buffer_lock:
+            target = self._ticks_buffered
+        with self._flushed:
+            if self._ticks_flushed >= target or self._flush_stop.is_set():
+                return
+            self._flush_now.set()
+            self._flushed.wait_for(lambda: self._ticks_flushed >= target, READ_FLUSH_TIMEOUT)
+    
+    def _merge_prices(self):
+        """Aggregate the staged ticks per symbol and merge them into each symbol's row for the day"""
+        self.conn.execute("""
+            INSERT INTO prices (date, symbol, exchange, open, high, low, close, volume, oi, last_updated)
+            SELECT day, symbol, exchange,
+                   -- A 0 in open/high/low means the field was missing, so fall back to the LTP
+                   arg_min(COALESCE(NULLIF(open, 0), ltp), seq),
+                   max(GREATEST(COALESCE(NULLIF(high, 0), ltp), ltp)),
+                   min(LEAST(COALESCE(NULLIF(low, 0), ltp), ltp)),
+                   arg_max(ltp, seq),
+                   max(volume),  -- Use max volume seen
+                   COALESCE(arg_max(oi, seq) FILTER (WHERE oi > 0), 0),  -- Latest OI if available
+                   max(timestamp)
+            FROM tick_staging
+            GROUP BY day, symbol, exchange
+            ON CONFLICT (date, symbol, exchange) DO UPDATE SET
+                high = GREATEST(prices.high, EXCLUDED.high),
+                low = CASE WHEN prices.low > 0 THEN LEAST(prices.low, EXCLUDED.low) ELSE EXCLUDED.low END,
+                close = EXCLUDED.close,
+                volume = GREATEST(prices.volume, EXCLUDED.volume),
+                oi = CASE WHEN EXCLUDED.oi > 0 THEN EXCLUDED.oi ELSE prices.oi END,
+                last_updated = EXCLUDED.last_updated
+        """)
+    
+    def _insert_ticks(self):
+        """Copy the staged ticks into real_time_ticks"""
+        # nextval() inline rather than the column default, so tables created
+        # before the default existed get ids too
+        self.conn.execute("""
+            INSERT INTO real_time_ticks 
+            (id, timestamp, symbol, exchange, ltp, volume, oi, bid, ask)
+            SELECT nextval('tick_id_seq'), timestamp, symbol, exchange, ltp, volume, oi, bid, ask
+            FROM tick_staging
+            ORDER BY seq
+        """)
+    
+    def _cursor(self) -> duckdb.DuckDBPyConnection:
+        """Cursor owned by the calling thread, so concurrent reads run in parallel"""
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            with self._lock:
+                if self.conn is None:
+                    raise RuntimeError("Database connection is closed")
+                cursor = self.conn.cursor()
+                self._cursors.append(cursor)
+            self._local.cursor = cursor
+        return cursor
     
     def get_current_price(self, symbol: str, exchange: str) -> Optional[Dict[str, Any]]:
         """
@@ -219,35 +413,35 @@ class PriceDatabase:
         Returns:
             Dict containing current price data or None if not found
         """
-        with self._lock:
-            try:
-                result = self.conn.execute("""
-                    SELECT symbol, exchange, open, high, low, close, volume, oi, last_updated
-                    FROM prices 
-                    WHERE symbol = ? AND exchange = ? AND date = CURRENT_DATE
-                    ORDER BY last_updated DESC 
-                    LIMIT 1
-                """, [symbol, exchange]).fetchone()
-                
-                if result:
-                    return {
-                        'symbol': result[0],
-                        'exchange': result[1],
-                        'open': float(result[2]),
-                        'high': float(result[3]),
-                        'low': float(result[4]),
-                        'close': float(result[5]),
-                        'ltp': float(result[5]),  # Close price as LTP
-                        'volume': int(result[6]),
-                        'oi': int(result[7]),
-                        'last_updated': result[8].isoformat() if result[8] else None
-                    }
-                
-                return None
-                
-            except Exception as e:
-                logger.error(f"Failed to get current price for {symbol}.{exchange}: {e}")
-                return None
+        self._wait_for_flush()
+        try:
+            cursor = self._cursor()
+            # Primary-key point lookup: at most one row per (date, symbol, exchange)
+            result = cursor.execute("""
+                SELECT symbol, exchange, open, high, low, close, volume, oi, last_updated
+                FROM prices 
+                WHERE date = CURRENT_DATE AND symbol = ? AND exchange = ?
+            """, [symbol, exchange]).fetchone()
+            
+            if result:
+                return {
+                    'symbol': result[0],
+                    'exchange': result[1],
+                    'open': result[2],
+                    'high': result[3],
+                    'low': result[4],
+                    'close': result[5],
+                    'ltp': result[5],  # Close price as LTP
+                    'volume': int(result[6]),
+                    'oi': int(result[7]),
+                    'last_updated': result[8].isoformat() if result[8] else None
+                }
+            
+            return None
+            
+        except Exception as e:
+            logger.error(f"Failed to get current price for {symbol}.{exchange}: {e}")
+            return None
     
     def get_price_history(self, symbol: str, exchange: str, days: int = 30) -> List[Dict[str, Any]]:
         """
@@ -261,36 +455,31 @@ class PriceDatabase:
         Returns:
             List of price data dictionaries
         """
-        with self._lock:
-            try:
-                results = self.conn.execute("""
-                    SELECT date, symbol, exchange, open, high, low, close, volume, oi, last_updated
-                    FROM prices 
-                    WHERE symbol = ? AND exchange = ?
-                    ORDER BY date DESC 
-                    LIMIT ?
-                """, [symbol, exchange, days]).fetchall()
-                
-                history = []
-                for row in results:
-                    history.append({
-                        'date': row[0].isoformat() if row[0] else None,
-                        'symbol': row[1],
-                        'exchange': row[2],
-                        'open': float(row[3]),
-                        'high': float(row[4]),
-                        'low': float(row[5]),
-                        'close': float(row[6]),
-                        'volume': int(row[7]),
-                        'oi': int(row[8]),
-                        'last_updated': row[9].isoformat() if row[9] else None
-                    })
-                
-                return history
-                
-            except Exception as e:
-                logger.error(f"Failed to get price history for {symbol}.{exchange}: {e}")
-                return []
+        self._wait_for_flush()
+        try:
+            cursor = self._cursor()
+            cursor.execute(f"""
+                SELECT CAST(date AS VARCHAR) AS date, symbol, exchange, open, high, low, close,
+                       volume, oi, {_iso_utc('last_updated')} AS last_updated
+                FROM prices 
+                WHERE symbol = ? AND exchange = ?
+                ORDER BY prices.date DESC 
+                LIMIT ?
+            """, [symbol, exchange, days])
+            
+            return _fetch_dicts(cursor)
+            
+        except Exception as e:
+            logger.error(f"Failed to get price history for {symbol}.{exchange}: {e}")
+            return []
+    
+    async def aget_current_price(self, symbol: str, exchange: str) -> Optional[Dict[str, Any]]:
+        """Async variant of get_current_price that runs the query off the event loop"""
+        return await asyncio.to_thread(self.get_current_price, symbol, exchange)
+    
+    async def aget_price_history(self, symbol: str, exchange: str, days: int = 30) -> List[Dict[str, Any]]:
+        """Async variant of get_price_history that runs the query off the event loop"""
+        return await asyncio.to_thread(self.get_price_history, symbol, exchange, days)
     
     def get_recent_ticks(self, symbol: str, exchange: str, limit: int = 100) -> List[Dict[str, Any]]:
         """
@@ -304,34 +493,26 @@ class PriceDatabase:
         Returns:
             List of tick data dictionaries
         """
-        with self._lock:
-            try:
-                results = self.conn.execute("""
-                    SELECT timestamp, symbol, exchange, ltp, volume, oi, bid, ask
-                    FROM real_time_ticks 
-                    WHERE symbol = ? AND exchange = ?
-                    ORDER BY timestamp DESC 
-                    LIMIT ?
-                """, [symbol, exchange, limit]).fetchall()
-                
-                ticks = []
-                for row in results:
-                    ticks.append({
-                        'timestamp': row[0].isoformat() if row[0] else None,
-                        'symbol': row[1],
-                        'exchange': row[2],
-                        'ltp': float(row[3]),
-                        'volume': int(row[4]),
-                        'oi': int(row[5]),
-                        'bid': float(row[6]),
-                        'ask': float(row[7])
-                    })
-                
-                return ticks
-                
-            except Exception as e:
-                logger.error(f"Failed to get recent ticks for {symbol}.{exchange}: {e}")
-                return []
+        self._wait_for_flush()
+        try:
+            cursor = self._cursor()
+            cursor.execute(f"""
+                SELECT {_iso_utc('timestamp')} AS timestamp, symbol, exchange, ltp, volume, oi, bid, ask
+                FROM real_time_ticks 
+                WHERE symbol = ? AND exchange = ?
+                ORDER BY real_time_ticks.timestamp DESC 
+                LIMIT ?
+            """, [symbol, exchange, limit])
+            
+            return _fetch_dicts(cursor)
+            
+        except Exception as e:
+            logger.error(f"Failed to get recent ticks for {symbol}.{exchange}: {e}")
+            return []
+    
+    async def aget_recent_ticks(self, symbol: str, exchange: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Async variant of get_recent_ticks that runs the query off the event loop"""
+        return await asyncio.to_thread(self.get_recent_ticks, symbol, exchange, limit)
     
     def get_market_status(self) -> Dict[str, Any]:
         """
@@ -340,39 +521,34 @@ class PriceDatabase:
         Returns:
             Dict containing market statistics
         """
-        with self._lock:
-            try:
-                # Count total symbols being tracked today
-                symbol_count = self.conn.execute("""
-                    SELECT COUNT(DISTINCT symbol || '.' || exchange) 
-                    FROM prices 
-                    WHERE date = CURRENT_DATE
-                """).fetchone()[0]
-                
-                # Get latest update time
-                latest_update = self.conn.execute("""
-                    SELECT MAX(last_updated) 
-                    FROM prices 
-                    WHERE date = CURRENT_DATE
-                """).fetchone()[0]
-                
-                # Count total ticks today
-                tick_count = self.conn.execute("""
-                    SELECT COUNT(*) 
-                    FROM real_time_ticks 
-                    WHERE DATE(timestamp) = CURRENT_DATE
-                """).fetchone()[0]
-                
-                return {
-                    'symbols_tracked': symbol_count,
-                    'latest_update': latest_update.isoformat() if latest_update else None,
-                    'ticks_today': tick_count,
-                    'database_size_mb': self._get_db_size_mb()
-                }
-                
-            except Exception as e:
-                logger.error(f"Failed to get market status: {e}")
-                return {}
+        self._wait_for_flush()
+        try:
+            cursor = self._cursor()
+            # Symbols tracked today and latest update time in one pass; the primary
+            # key guarantees one row per symbol per day
+            symbol_count, latest_update = cursor.execute("""
+                SELECT COUNT(*), MAX(last_updated) 
+                FROM prices 
+                WHERE date = CURRENT_DATE
+            """).fetchone()
+            
+            # Ticks written today, maintained by flush()
+            tick_count = self._tick_count if self._tick_count_date == date.today() else 0
+            
+            return {
+                'symbols_tracked': symbol_count,
+                'latest_update': latest_update.isoformat() if latest_update else None,
+                'ticks_today': tick_count,
+                'database_size_mb': self._get_db_size_mb()
+            }
+            
+        except Exception as e:
+            logger.error(f"Failed to get market status: {e}")
+            return {}
+    
+    async def aget_market_status(self) -> Dict[str, Any]:
+        """Async variant of get_market_status that runs the query off the event loop"""
+        return await asyncio.to_thread(self.get_market_status)
     
     def _get_db_size_mb(self) -> float:
         """Get database file size in MB"""
@@ -386,28 +562,69 @@ class PriceDatabase:
     
     def cleanup_old_ticks(self, days_to_keep: int = 7):
         """
-        Clean up old tick data to manage database size
+        Archive old tick data to Parquet and remove it from the database
+        
+        Each expired day is written to TICK_ARCHIVE_DIR/YYYYMMDD.parquet, where
+        it can still be queried with read_parquet().
         
         Args:
             days_to_keep: Number of days of tick data to retain
         """
+        cutoff = date.today() - timedelta(days=days_to_keep)
+        archive_dir = Path(self.db_path).parent / TICK_ARCHIVE_DIR
+        
         with self._lock:
+            self.flush()
             try:
+                self.conn.execute("BEGIN TRANSACTION")
+                old_days = [row[0] for row in self.conn.execute("""
+                    SELECT DISTINCT CAST(timestamp AS DATE)
+                    FROM real_time_ticks 
+                    WHERE timestamp < ?
+                """, [cutoff]).fetchall()]
+                if not old_days:
+                    self.conn.execute("ROLLBACK")
+                    return
+                
+                archive_dir.mkdir(parents=True, exist_ok=True)
+                for day in old_days:
+                    archive_file = str(archive_dir / f"{day:%Y%m%d}.parquet").replace("'", "''")
+                    self.conn.execute(f"""
+                        COPY (
+                            SELECT * FROM real_time_ticks
+                            WHERE timestamp >= DATE '{day}' AND timestamp < DATE '{day + timedelta(days=1)}'
+                            ORDER BY timestamp
+                        ) TO '{archive_file}' (FORMAT PARQUET, COMPRESSION zstd)
+                    """)
+                
                 deleted_count = self.conn.execute("""
                     DELETE FROM real_time_ticks 
-                    WHERE timestamp < CURRENT_TIMESTAMP - INTERVAL ? DAYS
-                """, [days_to_keep]).fetchone()
+                    WHERE timestamp < ?
+                """, [cutoff]).fetchone()[0]
+                self.conn.execute("COMMIT")
                 
-                if deleted_count:
-                    logger.info(f"Cleaned up {deleted_count} old tick records")
+                logger.info(f"Archived and cleaned up {deleted_count} old tick records from {len(old_days)} days")
                 
             except Exception as e:
+                self.conn.execute("ROLLBACK")
                 logger.error(f"Failed to cleanup old ticks: {e}")
     
+    async def acleanup_old_ticks(self, days_to_keep: int = 7):
+        """Async variant of cleanup_old_ticks that runs the delete off the event loop"""
+        await asyncio.to_thread(self.cleanup_old_ticks, days_to_keep)
+    
     def close(self):
-        """Close database connection"""
+        """Flush buffered ticks and close database connection"""
+        self._flush_stop.set()
+        self._flush_now.set()
         if self.conn:
-            self.conn.close()
+            with self._lock:
+                self.flush()
+                for cursor in self._cursors:
+                    cursor.close()
+                self._cursors.clear()
+                self.conn.close()
+                self.conn = None
             logger.info("Database connection closed")
 
 
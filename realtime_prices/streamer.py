@@ -4,23 +4,76 @@ Manages live data feeds and broadcasts price updates via WebSocket.
 """
 import asyncio
 import json
+import logging
 import os
 import time
 from datetime import datetime
-from typing import Dict, List, Set, Optional, Any, Callable
+from typing import Dict, List, Set, Optional, Any, Callable, Tuple
 import threading
 from dataclasses import dataclass
 from enum import Enum
+from functools import lru_cache
 
 from broker.angel.api.auth_api import authenticate_broker
 from broker.angel.api.data import BrokerData, get_api_response
 from broker.angel.streaming.angel_adapter import AngelWebSocketAdapter
 from realtime_prices.database import get_price_database, PriceDatabase
 from database.auth_db import store_tokens
+from database.token_db import get_symbol
 from utils.logging import get_logger
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 logger = get_logger(__name__)
 
+# Seconds a direct subscriber gets to accept a frame before it is dropped
+SEND_TIMEOUT = 2.0
+# Frames buffered per direct subscriber; the oldest is dropped when a slow client falls behind
+SUBSCRIBER_QUEUE_SIZE = 256
+# Ticks waiting to be broadcast; new ticks are dropped if the event loop falls this far behind
+BROADCAST_QUEUE_SIZE = 10000
+# Symbols subscribed at once at startup, and how long each keeps its slot (Angel rate limits)
+SUBSCRIBE_CONCURRENCY = 3
+SUBSCRIBE_DELAY = 1.0
+# Seconds between cleanups of old tick data
+CLEANUP_INTERVAL = 3600
+
+
+@lru_cache(maxsize=2048)
+def _parse_topic(topic: str) -> Tuple[Optional[str], Optional[str]]:
+    """Split an EXCHANGE_SYMBOL[_MODE] topic into (symbol, exchange); topics repeat, so memoize"""
+    exchange, sep, rest = topic.partition('_')
+    if not sep:
+        return None, None
+    return rest.partition('_')[0], exchange
+
+
+def _parse_price_data(data: Dict[str, Any], now_ms: int) -> Dict[str, Any]:
+    """
+    Build the price_data dict from an Angel WebSocket2 message.
+    
+    Angel uses short field names (lp = last price, v = volume, bp1/sp1 = best
+    bid/ask, ft = feed time); the long names are accepted as a fallback.
+    """
+    get = data.get
+    ltp = get('lp') or get('ltp') or 0
+    return {
+        'ltp': ltp,
+        'open': get('o') or get('open') or 0,
+        'high': get('h') or get('high') or 0,
+        'low': get('l') or get('low') or 0,
+        'close': get('c') or get('close') or ltp,
+        'volume': get('v') or get('volume') or 0,
+        'oi': get('oi') or 0,
+        'bid': get('bp1') or get('bid') or 0,
+        'ask': get('sp1') or get('ask') or 0,
+        'timestamp': get('timestamp') or get('ft') or now_ms
+    }
+
 
 class StreamingMode(Enum):
     """Streaming modes for different data types"""
@@ -41,25 +94,36 @@ class SymbolConfig:
 class AngelPriceStreamer:
     """Real-time price streamer using Angel broker WebSocket"""
     
-    def __init__(self, symbols: List[SymbolConfig] = None):
+    def __init__(self, symbols: List[SymbolConfig] = None, db: Optional[PriceDatabase] = None):
         """
         Initialize the price streamer
         
         Args:
             symbols: List of symbols to stream. If None, uses default symbols.
+            db: Database to write ticks to. If None, uses the shared price database.
         """
         self.symbols = symbols or self._get_default_symbols()
-        self.db = get_price_database()
+        self.db = db or get_price_database()
         self.ws_adapter = None
         self.broker_data = None
         self.auth_token = None
         self.feed_token = None
         
-        # Streaming state
+        # Streaming state. Subscribers are only touched on the event loop thread, so no lock.
         self.running = False
         self.connected = False
-        self._subscribers = set()  # WebSocket connections to broadcast to
-        self._lock = threading.RLock()
+        self._subscribers: Dict[Any, asyncio.Queue] = {}  # WebSocket -> frames waiting to be sent
+        self._subscriber_queues: tuple = ()  # Snapshot of the queues, rebuilt when subscribers change
+        self._writers: Dict[Any, asyncio.Task] = {}  # WebSocket -> task draining its queue
+        
+        # Ticks arrive on the WebSocket thread and are handed to the event loop here
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tx_queue: Optional[asyncio.Queue] = None
+        self._broadcast_task: Optional[asyncio.Task] = None
+        self._cleanup_handle: Optional[asyncio.TimerHandle] = None
+        self._cleanup_task: Optional[asyncio.Task] = None
+        self._manager = None  # The API's WebSocketManager, imported on first broadcast
+        self._disconnected: Optional[asyncio.Event] = None  # Set when the adapter gives up reconnecting
         
         # Reconnection settings
         self.reconnect_delay = 5
@@ -68,17 +132,20 @@ class AngelPriceStreamer:
         self.max_reconnect_attempts = 10
         
         # Rate limiting for database updates
-        self._last_db_update = {}
         self.min_update_interval = 1.0  # Minimum seconds between DB updates per symbol
+        self._min_update_interval_ns = int(self.min_update_interval * 1e9)
+        self._next_db_update_ns: Dict[tuple, int] = {}  # (symbol, exchange) -> monotonic ns
+        self._last_quote: Dict[tuple, tuple] = {}  # (symbol, exchange) -> last (ltp, volume) written
         
-        # Statistics
+        # Statistics; the per-tick counters are plain attributes and get_stats()
+        # folds them into the stats dict
         self.stats = {
-            'messages_received': 0,
-            'db_updates': 0,
-            'broadcast_count': 0,
-            'start_time': None,
-            'last_message_time': None
+            'start_time': None
         }
+        self._messages_received = 0
+        self._db_updates = 0
+        self._broadcast_count = 0
+        self._last_message_ts: Optional[float] = None
     
     def _get_default_symbols(self) -> List[SymbolConfig]:
         """Get default symbols to stream"""
@@ -133,6 +200,15 @@ class AngelPriceStreamer:
         self.running = True
         self.stats['start_time'] = datetime.now()
         
+        # One long-lived broadcaster instead of a task per tick
+        self._loop = asyncio.get_running_loop()
+        self._tx_queue = asyncio.Queue(maxsize=BROADCAST_QUEUE_SIZE)
+        self._broadcast_task = asyncio.create_task(self._broadcast_loop())
+        self._disconnected = asyncio.Event()
+        
+        # Clean up old tick data now and then hourly, on a timer rather than by polling
+        self._schedule_cleanup()
+        
         logger.info("Starting Angel price streaming...")
         
         try:
@@ -164,8 +240,9 @@ class AngelPriceStreamer:
             # Initialize and connect
             self.ws_adapter.initialize("angel", "STREAMING_CLIENT", auth_data)
             
-            # Set up message handler BEFORE connecting
+            # Set up message handlers BEFORE connecting
             self.ws_adapter.on_market_data = self._handle_market_data
+            self.ws_adapter.on_disconnect = self._handle_disconnect
             logger.info("🔧 Message handler configured")
             
             logger.info("🔗 Connecting to Angel WebSocket...")
@@ -213,64 +290,73 @@ class AngelPriceStreamer:
             self.connected = True  # Force connected state
     
     async def _subscribe_symbols(self):
-        """Subscribe to all configured symbols"""
+        """Subscribe to all configured symbols, a few at a time"""
         logger.info(f"🔔 Starting subscription to {len(self.symbols)} symbols...")
         
-        for symbol_config in self.symbols:
-            if not symbol_config.enabled:
-                continue
-                
-            try:
-                logger.info(f"📡 Attempting to subscribe to {symbol_config.symbol}.{symbol_config.exchange} (mode: {symbol_config.mode.name})")
-                
-                # Use asyncio.to_thread for the synchronous subscribe call
-                response = await asyncio.to_thread(
-                    self.ws_adapter.subscribe,
-                    symbol_config.symbol,
-                    symbol_config.exchange,
-                    symbol_config.mode.value
-                )
-                
-                logger.info(f"📡 Subscription response for {symbol_config.symbol}: {response}")
-                
-                if response and response.get('status') == 'success':
-                    logger.info(f"✅ Successfully subscribed to {symbol_config.symbol}.{symbol_config.exchange}")
-                elif response and 'error' in response:
-                    logger.warning(f"❌ Subscription failed for {symbol_config.symbol}.{symbol_config.exchange}: {response.get('error', response)}")
-                else:
-                    logger.warning(f"❌ Unexpected subscription response for {symbol_config.symbol}.{symbol_config.exchange}: {response}")
-                
-                # Add a small delay between subscriptions
-                await asyncio.sleep(1.0)  # Increased delay for Angel rate limits
-                
-            except Exception as e:
-                logger.error(f"❌ Error subscribing to {symbol_config.symbol}.{symbol_config.exchange}: {e}")
+        # Angel rate-limits subscriptions, so only SUBSCRIBE_CONCURRENCY run at once
+        semaphore = asyncio.Semaphore(SUBSCRIBE_CONCURRENCY)
+        
+        async def subscribe_one(symbol_config: SymbolConfig):
+            async with semaphore:
+                await self._subscribe_symbol(symbol_config)
+        
+        await asyncio.gather(*(subscribe_one(symbol_config) for symbol_config in self.symbols
+                               if symbol_config.enabled))
         
         logger.info(f"🔔 Subscription process completed. Waiting for real-time data...")
     
+    async def _subscribe_symbol(self, symbol_config: SymbolConfig):
+        """Subscribe to one symbol, holding its slot for SUBSCRIBE_DELAY afterwards"""
+        try:
+            logger.info(f"📡 Attempting to subscribe to {symbol_config.symbol}.{symbol_config.exchange} (mode: {symbol_config.mode.name})")
+            
+            # Use asyncio.to_thread for the synchronous subscribe call
+            response = await asyncio.to_thread(
+                self.ws_adapter.subscribe,
+                symbol_config.symbol,
+                symbol_config.exchange,
+                symbol_config.mode.value
+            )
+            
+            logger.info(f"📡 Subscription response for {symbol_config.symbol}: {response}")
+            
+            if response and response.get('status') == 'success':
+                logger.info(f"✅ Successfully subscribed to {symbol_config.symbol}.{symbol_config.exchange}")
+            elif response and 'error' in response:
+                logger.warning(f"❌ Subscription failed for {symbol_config.symbol}.{symbol_config.exchange}: {response.get('error', response)}")
+            else:
+                logger.warning(f"❌ Unexpected subscription response for {symbol_config.symbol}.{symbol_config.exchange}: {response}")
+            
+            # Pace each slot for Angel rate limits
+            await asyncio.sleep(SUBSCRIBE_DELAY)
+            
+        except Exception as e:
+            logger.error(f"❌ Error subscribing to {symbol_config.symbol}.{symbol_config.exchange}: {e}")
+    
     async def _streaming_loop(self):
-        """Main streaming loop"""
+        """Main streaming loop; sleeps until the connection is lost"""
         logger.info("Price streaming started")
         
         while self.running:
             try:
-                # Check connection health
-                if not self.connected:
+                await self._disconnected.wait()
+                self._disconnected.clear()
+                
+                if self.running and not self.connected:
                     logger.warning("Connection lost, attempting to reconnect...")
                     await self._handle_reconnection()
                 
-                # Update statistics
-                await self._update_stats()
-                
-                # Clean up old tick data periodically
-                await self._periodic_cleanup()
-                
-                await asyncio.sleep(1)
-                
             except Exception as e:
                 logger.error(f"Error in streaming loop: {e}")
                 await asyncio.sleep(5)
     
+    def _handle_disconnect(self):
+        """Adapter callback (WebSocket thread) once it has given up reconnecting"""
+        self.connected = False
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._disconnected.set)
+    
     def _handle_market_data(self, topic: str, data: Dict[str, Any]):
         """
         Handle incoming market data from WebSocket
@@ -280,145 +366,129 @@ class AngelPriceStreamer:
             data: Market data dictionary
         """
         try:
-            self.stats['messages_received'] += 1
-            self.stats['last_message_time'] = datetime.now()
+            # Read the clock once and reuse it for every timestamp this tick produces
+            now = time.time()
+            now_ms = int(now * 1000)
             
-            # Debug: Log all incoming data
-            logger.info(f"🔥 Received market data - Topic: {topic}")
-            logger.info(f"🔥 Data keys: {list(data.keys()) if data else 'None'}")
-            logger.info(f"🔥 Raw data: {data}")
+            self._messages_received += 1
+            self._last_message_ts = now
+            
+            # Debug: Log all incoming data (skip the formatting entirely unless enabled)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"🔥 Received market data - Topic: {topic}")
+                logger.debug(f"🔥 Data keys: {list(data.keys()) if data else 'None'}")
+                logger.debug(f"🔥 Raw data: {data}")
             
             # Extract symbol and exchange from topic or data
             # Angel WebSocket2 format handling
-            symbol = None
-            exchange = None
-            
             # Try to parse from topic first
-            if topic and '_' in topic:
-                parts = topic.split('_')
-                if len(parts) >= 2:
-                    exchange = parts[0]
-                    symbol = parts[1]
+            symbol, exchange = _parse_topic(topic) if topic else (None, None)
             
             # Fallback to data parsing if available
             if not symbol and data:
                 symbol = data.get('symbol') or data.get('tk')  # tk is token in Angel format
                 exchange = data.get('exchange') or data.get('e')
                 
-                # Map token to symbol if needed
-                if symbol and symbol.isdigit():
-                    from database.token_db import get_br_symbol, get_brexchange
-                    try:
-                        symbol = get_br_symbol(symbol)
-                        exchange = get_brexchange(symbol) if not exchange else exchange
-                    except Exception as e:
-                        logger.debug(f"Token mapping failed for {symbol}: {e}")
+                # Map token to symbol if needed (get_symbol is memoized in token_db)
+                if symbol and exchange and symbol.isdigit():
+                    symbol = get_symbol(symbol, exchange) or symbol
             
             if not symbol or not exchange:
                 logger.warning(f"Unable to extract symbol/exchange from topic: {topic}, data keys: {list(data.keys()) if data else 'None'}")
                 return
             
-            # Prepare price data - Angel WebSocket2 format
-            # Angel uses specific field names: lp (last price), v (volume), etc.
-            price_data = {
-                'ltp': data.get('lp') or data.get('ltp') or 0,  # lp = last price in Angel format
-                'open': data.get('o') or data.get('open') or 0,
-                'high': data.get('h') or data.get('high') or 0,
-                'low': data.get('l') or data.get('low') or 0,
-                'close': data.get('c') or data.get('close') or data.get('lp') or data.get('ltp') or 0,
-                'volume': data.get('v') or data.get('volume') or 0,
-                'oi': data.get('oi') or 0,
-                'bid': data.get('bp1') or data.get('bid') or 0,  # bp1 = best bid price
-                'ask': data.get('sp1') or data.get('ask') or 0,  # sp1 = best ask price
-                'timestamp': data.get('timestamp') or data.get('ft') or int(time.time() * 1000)  # ft = feed time
-            }
+            price_data = _parse_price_data(data, now_ms)
             
             # Validate LTP
             if not price_data['ltp'] or price_data['ltp'] <= 0:
                 logger.debug(f"Invalid LTP for {symbol}.{exchange}: {price_data['ltp']}")
                 return
             
-            # Rate limit database updates
-            symbol_key = f"{symbol}.{exchange}"
-            current_time = time.time()
+            # Skip ticks that repeat the last LTP and volume written for the symbol; nothing
+            # traded. Only written quotes count, so a rate-limited tick still reaches the DB later.
+            symbol_key = (symbol, exchange)
+            quote = (price_data['ltp'], price_data['volume'])
+            if self._last_quote.get(symbol_key) == quote:
+                return
+            
+            # Rate limit database updates on the monotonic clock, immune to wall-clock jumps
+            now_ns = time.monotonic_ns()
             
-            if (symbol_key not in self._last_db_update or 
-                current_time - self._last_db_update[symbol_key] >= self.min_update_interval):
+            if now_ns >= self._next_db_update_ns.get(symbol_key, 0):
                 
                 # Update database
                 try:
                     if self.db.upsert_price(symbol, exchange, price_data):
-                        self.stats['db_updates'] += 1
-                        self._last_db_update[symbol_key] = current_time
-                        logger.info(f"📈 Real-time update: {symbol}.{exchange} = ₹{price_data['ltp']:.2f} (Vol: {price_data['volume']})")
+                        self._db_updates += 1
+                        self._next_db_update_ns[symbol_key] = now_ns + self._min_update_interval_ns
+                        self._last_quote[symbol_key] = quote
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug(f"📈 Real-time update: {symbol}.{exchange} = ₹{price_data['ltp']:.2f} (Vol: {price_data['volume']})")
                     else:
                         logger.warning(f"Failed to update database for {symbol}.{exchange}")
                 except Exception as e:
                     logger.error(f"Database update error for {symbol}.{exchange}: {e}")
             
-            # Broadcast to subscribers
-            asyncio.create_task(self._broadcast_update(symbol, exchange, price_data))
+            # Broadcast to subscribers; this runs on the WebSocket thread, so hand the
+            # tick to the event loop's broadcast queue
+            loop = self._loop
+            if loop is not None and not loop.is_closed():
+                loop.call_soon_threadsafe(self._enqueue_broadcast,
+                                          (symbol, exchange, price_data, now_ms))
             
         except Exception as e:
             logger.error(f"Error handling market data: {e}")
     
-    async def _broadcast_update(self, symbol: str, exchange: str, price_data: Dict[str, Any]):
-        """Broadcast price update to WebSocket subscribers"""
+    def _enqueue_broadcast(self, item: tuple):
+        """Queue a tick for the broadcast loop (runs on the event loop)"""
+        try:
+            self._tx_queue.put_nowait(item)
+        except asyncio.QueueFull:
+            logger.warning("Broadcast queue full, dropping tick")
+    
+    async def _broadcast_loop(self):
+        """Drain the broadcast queue for as long as streaming runs"""
+        queue = self._tx_queue
+        while self.running:
+            item = await queue.get()
+            await self._broadcast_update(*item)
+    
+    async def _broadcast_update(self, symbol: str, exchange: str, price_data: Dict[str, Any],
+                                timestamp_ms: int):
+        """Broadcast price update to WebSocket subscribers, stamped with the tick's receive time"""
         try:
             message = {
                 'type': 'price_update',
                 'symbol': symbol,
                 'exchange': exchange,
                 'data': price_data,
-                'timestamp': int(time.time() * 1000)
+                'timestamp': timestamp_ms
             }
             
-            message_json = json.dumps(message)
-            
-            # Broadcast to streamer's direct subscribers
-            if self._subscribers:
-                disconnected = set()
-                for websocket in self._subscribers.copy():
+            # Queue for the streamer's direct subscribers; their writer tasks do the
+            # sending, so a slow peer never holds up the tick path
+            queues = self._subscriber_queues
+            if queues:
+                payload = orjson.dumps(message) if ORJSON_AVAILABLE else json.dumps(message).encode()
+                for queue in queues:
                     try:
-                        await websocket.send_text(message_json)
-                        self.stats['broadcast_count'] += 1
-                    except Exception:
-                        disconnected.add(websocket)
-                
-                # Remove disconnected clients
-                self._subscribers -= disconnected
+                        queue.put_nowait(payload)
+                    except asyncio.QueueFull:
+                        queue.get_nowait()  # Drop the oldest frame
+                        queue.put_nowait(payload)
             
-            # Store latest data for WebSocket manager to access
+            # Publish to the API WebSocket manager
             try:
-                # Import here to avoid circular import
-                from realtime_prices.api import manager
-                symbol_key = f"{exchange}_{symbol}"
+                manager = self._manager
+                if manager is None:
+                    # Import here to avoid circular import; resolved once, then reused
+                    from realtime_prices.api import manager
+                    self._manager = manager
                 
-                # Store the latest message in the manager for WebSocket clients to access
-                if hasattr(manager, 'latest_prices'):
-                    manager.latest_prices[symbol_key] = message
-                else:
-                    manager.latest_prices = {symbol_key: message}
-                
-                # Try simple broadcast - if it fails, the data is still stored
-                try:
-                    # Create a simple message JSON for direct sending
-                    message_json = json.dumps(message)
-                    # Use the manager's existing broadcast method with symbol filter
-                    import asyncio
-                    # Only try if there's an active event loop in this thread
-                    try:
-                        loop = asyncio.get_running_loop()
-                        # Schedule for next cycle
-                        loop.call_soon(lambda: asyncio.create_task(manager.broadcast(message_json, symbol_key)))
-                        logger.debug(f"Scheduled broadcast for {symbol}.{exchange}")
-                    except RuntimeError:
-                        # No running loop in this thread - that's OK, data is stored
-                        logger.debug(f"Stored data for {symbol}.{exchange} - WebSocket will get it on next check")
-                except Exception as e:
-                    logger.debug(f"Broadcast scheduling failed for {symbol}.{exchange}: {e}")
+                # Hand the message to the manager, which pushes it to subscribed clients
+                manager.publish(f"{exchange}_{symbol}", message)
                 
-                self.stats['broadcast_count'] += 1
+                self._broadcast_count += 1
                 
             except Exception as e:
                 logger.debug(f"Could not handle WebSocket data for main manager: {e}")
@@ -426,6 +496,19 @@ class AngelPriceStreamer:
         except Exception as e:
             logger.error(f"Error broadcasting update: {e}")
     
+    async def _subscriber_writer(self, websocket, queue: asyncio.Queue):
+        """Send one subscriber's queued frames until it fails or is removed"""
+        try:
+            while True:
+                payload = await queue.get()
+                await asyncio.wait_for(websocket.send_bytes(payload), timeout=SEND_TIMEOUT)
+                self._broadcast_count += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"Dropping subscriber after failed send: {e}")
+            self.remove_subscriber(websocket)
+    
     async def _handle_reconnection(self):
         """Handle WebSocket reconnection"""
         if self.reconnect_attempts >= self.max_reconnect_attempts:
@@ -440,42 +523,51 @@ class AngelPriceStreamer:
         await asyncio.sleep(delay)
         
         try:
+            if self.ws_adapter:
+                self.ws_adapter.disconnect()
             await self._initialize_websocket()
             self.reconnect_attempts = 0  # Reset on successful connection
             logger.info("Reconnection successful")
         except Exception as e:
             logger.error(f"Reconnection failed: {e}")
+            self.connected = False
+            self._disconnected.set()  # Try again on the next pass of the streaming loop
     
-    async def _update_stats(self):
-        """Update streaming statistics"""
-        # This could be extended to save stats to database or log periodically
-        pass
+    def _schedule_cleanup(self):
+        """Start a tick cleanup now and schedule the next one CLEANUP_INTERVAL from now"""
+        if not self.running:
+            return
+        self._cleanup_task = asyncio.create_task(self._cleanup_old_ticks())
+        self._cleanup_handle = self._loop.call_later(CLEANUP_INTERVAL, self._schedule_cleanup)
     
-    async def _periodic_cleanup(self):
-        """Perform periodic cleanup tasks"""
+    async def _cleanup_old_ticks(self):
+        """Clean up old tick data off the event loop"""
         try:
-            # Clean up old tick data every hour
-            if hasattr(self, '_last_cleanup'):
-                if time.time() - self._last_cleanup < 3600:  # 1 hour
-                    return
-            
-            self.db.cleanup_old_ticks(days_to_keep=7)
-            self._last_cleanup = time.time()
-            
+            await self.db.acleanup_old_ticks(days_to_keep=7)
         except Exception as e:
             logger.error(f"Error in periodic cleanup: {e}")
     
     def add_subscriber(self, websocket):
-        """Add WebSocket subscriber for price updates"""
-        with self._lock:
-            self._subscribers.add(websocket)
-            logger.info(f"Added subscriber. Total: {len(self._subscribers)}")
+        """Add WebSocket subscriber for price updates (call from the event loop)"""
+        if websocket in self._subscribers:
+            return
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[websocket] = queue
+        self._subscriber_queues = tuple(self._subscribers.values())
+        self._writers[websocket] = asyncio.get_running_loop().create_task(
+            self._subscriber_writer(websocket, queue)
+        )
+        logger.info(f"Added subscriber. Total: {len(self._subscribers)}")
     
     def remove_subscriber(self, websocket):
-        """Remove WebSocket subscriber"""
-        with self._lock:
-            self._subscribers.discard(websocket)
-            logger.info(f"Removed subscriber. Total: {len(self._subscribers)}")
+        """Remove WebSocket subscriber (call from the event loop)"""
+        self._subscribers.pop(websocket, None)
+        self._subscriber_queues = tuple(self._subscribers.values())
+        writer = self._writers.pop(websocket, None)
+        logger.info(f"Removed subscriber. Total: {len(self._subscribers)}")
+        # A writer removing its own subscriber simply returns
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
     
     def add_symbol(self, symbol: str, exchange: str, mode: StreamingMode = StreamingMode.QUOTE):
         """Add a new symbol to stream"""
@@ -510,6 +602,11 @@ class AngelPriceStreamer:
     def get_stats(self) -> Dict[str, Any]:
         """Get streaming statistics"""
         stats = self.stats.copy()
+        stats['messages_received'] = self._messages_received
+        stats['db_updates'] = self._db_updates
+        stats['broadcast_count'] = self._broadcast_count
+        stats['last_message_time'] = (datetime.fromtimestamp(self._last_message_ts)
+                                      if self._last_message_ts is not None else None)
         stats['symbols_count'] = len([s for s in self.symbols if s.enabled])
         stats['subscribers_count'] = len(self._subscribers)
         stats['running'] = self.running
@@ -532,9 +629,23 @@ class AngelPriceStreamer:
             except Exception as e:
                 logger.error(f"Error disconnecting WebSocket: {e}")
         
+        if self._disconnected:
+            self._disconnected.set()  # Wake the streaming loop so it sees running is False
+        
+        if self._broadcast_task and self._broadcast_task is not asyncio.current_task():
+            self._broadcast_task.cancel()
+        self._broadcast_task = None
+        if self._cleanup_handle:
+            self._cleanup_handle.cancel()
+            self._cleanup_handle = None
+        self._loop = None
+        
         # Clear subscribers
-        with self._lock:
-            self._subscribers.clear()
+        for writer in self._writers.values():
+            writer.cancel()
+        self._writers.clear()
+        self._subscribers.clear()
+        self._subscriber_queues = ()
         
         logger.info("Price streaming stopped")
 
@@ -6,7 +6,12 @@ import asyncio
 import json
 import os
 import sys
+import tempfile
+import threading
 import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
 # Add current directory to Python path
@@ -14,31 +19,69 @@ current_dir = Path(__file__).parent
 sys.path.insert(0, str(current_dir))
 
 import httpx
-import websocket
-from realtime_prices.database import PriceDatabase
-from realtime_prices.streamer import SymbolConfig, StreamingMode
+import websockets
+
+try:
+    import uvloop
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
+from realtime_prices.database import PriceDatabase, FLUSH_BATCH_TICKS, MAX_BUFFERED_TICKS
+from realtime_prices.streamer import AngelPriceStreamer, SymbolConfig, StreamingMode
 from utils.logging import get_logger
 
 logger = get_logger(__name__)
 
+# One recorded check; a namedtuple rather than a dict per result
+CheckResult = namedtuple('CheckResult', 'name success message')
+
+# Text frames sent by the WebSocket test; kept as str since /ws reads JSON clients with receive_text
+_PING_FRAME = json.dumps({"type": "ping"})
+
+
+@lru_cache(maxsize=256)
+def _subscribe_frame(symbol: str, exchange: str) -> str:
+    """Serialized subscribe message for a symbol"""
+    return json.dumps({"type": "subscribe", "symbol": symbol, "exchange": exchange})
+
+
+# The WebSocket test runs on uvloop when it is installed, like the server does
+_new_event_loop = uvloop.new_event_loop if UVLOOP_AVAILABLE else asyncio.new_event_loop
+
 
 class SystemTester:
     """Comprehensive system tester"""
     
     def __init__(self, base_url: str = "http://localhost:8000"):
         self.base_url = base_url
-        self.client = httpx.Client(timeout=30.0)
+        self.ws_url = base_url.replace("http://", "ws://").replace("https://", "wss://") + "/ws"
+        # One pooled keep-alive client for every endpoint test
+        self.client = httpx.Client(
+            base_url=base_url,
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=40, keepalive_expiry=60)
+        )
         self.test_results = []
+        # Running tallies so the summary doesn't rescan test_results; log_test runs on two threads
+        self.passed_count = 0
+        self.failed_count = 0
+        self._results_lock = threading.Lock()
+    
+    def close(self):
+        """Close the pooled HTTP client"""
+        self.client.close()
     
     def log_test(self, test_name: str, success: bool, message: str = ""):
         """Log test result"""
         status = "✅ PASS" if success else "❌ FAIL"
         logger.info(f"{status} {test_name}: {message}")
-        self.test_results.append({
-            "test": test_name,
-            "success": success,
-            "message": message
-        })
+        with self._results_lock:
+            self.test_results.append(CheckResult(test_name, success, message))
+            if success:
+                self.passed_count += 1
+            else:
+                self.failed_count += 1
     
     def test_database_operations(self):
         """Test database functionality"""
@@ -85,34 +128,128 @@ class SystemTester:
         except Exception as e:
             self.log_test("Database Operations", False, f"Error: {e}")
     
+    def test_ohlc_aggregation(self):
+        """Test that ticks without OHLC fields (LTP mode sends 0) build the day's OHLC from the LTP"""
+        logger.info("🕯️ Testing OHLC Aggregation...")
+        
+        try:
+            db = PriceDatabase(":memory:")
+            
+            for ltp in (100.0, 101.0, 99.5):
+                db.upsert_price("LTPONLY", "NSE", {'ltp': ltp, 'open': 0, 'high': 0, 'low': 0})
+            db.flush()
+            
+            price = db.get_current_price("LTPONLY", "NSE")
+            success = (price is not None and price['open'] == 100.0 and price['high'] == 101.0
+                       and price['low'] == 99.5 and price['close'] == 99.5)
+            self.log_test("Zero OHLC Ticks", success, f"Aggregated: {price}")
+            
+            db.close()
+            
+        except Exception as e:
+            self.log_test("OHLC Aggregation", False, f"Error: {e}")
+    
+    def test_concurrent_writes_and_reads(self):
+        """Test that a tick writer flooding the buffer neither grows it unbounded nor starves readers"""
+        logger.info("🧵 Testing Concurrent Writes and Reads...")
+        
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                db = PriceDatabase(str(Path(tmp_dir) / "prices.db"))
+                stop = threading.Event()
+                reads = [0] * 4
+                peak_buffer = 0
+                written = 0
+                
+                def write():
+                    nonlocal peak_buffer, written
+                    while not stop.is_set():
+                        db.upsert_price("LOADTEST", "NSE", {'ltp': 100.0 + written % 10, 'volume': written})
+                        written += 1
+                        peak_buffer = max(peak_buffer, len(db._tick_buffer))
+                
+                def read(reader):
+                    while not stop.is_set():
+                        db.get_current_price("LOADTEST", "NSE")
+                        reads[reader] += 1
+                
+                threads = [threading.Thread(target=write)]
+                threads += [threading.Thread(target=read, args=(reader,)) for reader in range(len(reads))]
+                for thread in threads:
+                    thread.start()
+                time.sleep(3)
+                stop.set()
+                for thread in threads:
+                    thread.join(timeout=30)
+                
+                success = not any(thread.is_alive() for thread in threads) and all(reads)
+                self.log_test("Readers Under Write Load", success, f"Reads per reader: {reads}")
+                
+                success = peak_buffer <= MAX_BUFFERED_TICKS + FLUSH_BATCH_TICKS
+                self.log_test("Bounded Tick Buffer", success, f"Peak buffer: {peak_buffer} ticks")
+                
+                db.flush()
+                status = db.get_market_status()
+                success = status.get('ticks_today') == written
+                self.log_test("All Ticks Written", success, f"Written: {written}, stored: {status.get('ticks_today')}")
+                
+                db.close()
+            
+        except Exception as e:
+            self.log_test("Concurrent Writes and Reads", False, f"Error: {e}")
+    
+    def test_repeated_tick_after_rate_limit(self):
+        """Test that a tick skipped by the DB rate limit is still written when it repeats"""
+        logger.info("⏱️ Testing Rate-Limited Repeated Ticks...")
+        
+        try:
+            db = PriceDatabase(":memory:")
+            streamer = AngelPriceStreamer(symbols=[], db=db)
+            
+            streamer._handle_market_data("NSE_RATETEST_QUOTE", {'lp': 100.0, 'v': 10})
+            # Within min_update_interval, so this one is rate-limited
+            streamer._handle_market_data("NSE_RATETEST_QUOTE", {'lp': 101.0, 'v': 20})
+            # Let the interval pass, then the same quote repeats
+            streamer._next_db_update_ns.clear()
+            streamer._handle_market_data("NSE_RATETEST_QUOTE", {'lp': 101.0, 'v': 20})
+            
+            price = db.get_current_price("RATETEST", "NSE")
+            success = price is not None and price['close'] == 101.0
+            self.log_test("Rate-Limited Repeat Tick", success, f"Close: {price['close'] if price else None}")
+            
+            db.close()
+            
+        except Exception as e:
+            self.log_test("Rate-Limited Repeat Tick", False, f"Error: {e}")
+    
     def test_api_endpoints(self):
         """Test REST API endpoints"""
         logger.info("🌐 Testing API Endpoints...")
         
         try:
             # Test health endpoint
-            response = self.client.get(f"{self.base_url}/health")
+            response = self.client.get("/health")
             success = response.status_code == 200
             self.log_test("Health Endpoint", success, f"Status: {response.status_code}")
             
             # Test root endpoint
-            response = self.client.get(f"{self.base_url}/")
+            response = self.client.get("/")
             success = response.status_code == 200
             data = response.json() if success else {}
             self.log_test("Root Endpoint", success, f"Message: {data.get('message', 'N/A')}")
             
             # Test market status endpoint
-            response = self.client.get(f"{self.base_url}/market/status")
+            response = self.client.get("/market/status")
             success = response.status_code in [200, 503]  # 503 if no data yet
             self.log_test("Market Status Endpoint", success, f"Status: {response.status_code}")
             
             # Test price endpoint (might fail if no data)
-            response = self.client.get(f"{self.base_url}/price/RELIANCE?exchange=NSE")
+            response = self.client.get("/price/RELIANCE?exchange=NSE")
             success = response.status_code in [200, 404]  # 404 if no data
             self.log_test("Price Endpoint", success, f"Status: {response.status_code}")
             
             # Test history endpoint
-            response = self.client.get(f"{self.base_url}/history/RELIANCE?exchange=NSE&days=10")
+            response = self.client.get("/history/RELIANCE?exchange=NSE&days=10")
             success = response.status_code in [200, 404]
             self.log_test("History Endpoint", success, f"Status: {response.status_code}")
             
@@ -124,54 +261,27 @@ class SystemTester:
         logger.info("🔌 Testing WebSocket Connection...")
         
         try:
-            ws_url = self.base_url.replace("http://", "ws://") + "/ws"
+            async def run():
+                async with websockets.connect(self.ws_url, ping_interval=10, ping_timeout=20) as ws:
+                    logger.info("WebSocket connection opened")
+                    # Test subscription, then ping; the pong is the last reply we wait for
+                    await ws.send(_subscribe_frame("RELIANCE", "NSE"))
+                    await ws.send(_PING_FRAME)
+                    await asyncio.wait_for(wait_for_pong(ws), timeout=5.0)
             
-            def on_message(ws, message):
-                try:
-                    data = json.loads(message)
-                    logger.info(f"Received WebSocket message: {data.get('type', 'unknown')}")
-                except:
-                    logger.info(f"Received WebSocket message: {message}")
+            async def wait_for_pong(ws):
+                while True:
+                    message = json.loads(await ws.recv())
+                    logger.info(f"Received WebSocket message: {message.get('type', 'unknown')}")
+                    if message.get('type') == 'pong':
+                        return
             
-            def on_error(ws, error):
-                logger.error(f"WebSocket error: {error}")
-            
-            def on_close(ws, close_status_code, close_msg):
-                logger.info("WebSocket connection closed")
-            
-            def on_open(ws):
-                logger.info("WebSocket connection opened")
-                # Test subscription
-                subscribe_msg = {
-                    "type": "subscribe",
-                    "symbol": "RELIANCE",
-                    "exchange": "NSE"
-                }
-                ws.send(json.dumps(subscribe_msg))
-                
-                # Test ping
-                ping_msg = {"type": "ping"}
-                ws.send(json.dumps(ping_msg))
-                
-                # Close after a short time
-                def close_connection():
-                    time.sleep(2)
-                    ws.close()
-                
-                import threading
-                threading.Thread(target=close_connection).start()
-            
-            # Create WebSocket connection
-            ws = websocket.WebSocketApp(
-                ws_url,
-                on_open=on_open,
-                on_message=on_message,
-                on_error=on_error,
-                on_close=on_close
-            )
-            
-            # Run for a short time
-            ws.run_forever(ping_interval=10, ping_timeout=5)
+            # A private loop rather than a global policy, so importing this module changes nothing
+            loop = _new_event_loop()
+            try:
+                loop.run_until_complete(run())
+            finally:
+                loop.close()
             self.log_test("WebSocket Connection", True, "Connection successful")
             
         except Exception as e:
@@ -204,19 +314,24 @@ class SystemTester:
         logger.info("🚀 Starting System Tests...")
         logger.info("=" * 60)
         
-        # Run tests
+        # Run tests; the API and WebSocket suites only wait on the network, so overlap them
         self.test_configuration()
         self.test_database_operations()
-        self.test_api_endpoints()
-        self.test_websocket_connection()
+        self.test_ohlc_aggregation()
+        self.test_concurrent_writes_and_reads()
+        self.test_repeated_tick_after_rate_limit()
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            for future in [pool.submit(self.test_api_endpoints),
+                           pool.submit(self.test_websocket_connection)]:
+                future.result()
         
         # Summary
         logger.info("=" * 60)
         logger.info("📊 Test Summary:")
         
-        total_tests = len(self.test_results)
-        passed_tests = sum(1 for result in self.test_results if result['success'])
-        failed_tests = total_tests - passed_tests
+        passed_tests = self.passed_count
+        failed_tests = self.failed_count
+        total_tests = passed_tests + failed_tests
         
         logger.info(f"Total Tests: {total_tests}")
         logger.info(f"Passed: {passed_tests}")
@@ -226,8 +341,8 @@ class SystemTester:
         if failed_tests > 0:
             logger.info("❌ Failed Tests:")
             for result in self.test_results:
-                if not result['success']:
-                    logger.info(f"  • {result['test']}: {result['message']}")
+                if not result.success:
+                    logger.info(f"  • {result.name}: {result.message}")
         
         logger.info("=" * 60)
         
@@ -249,12 +364,15 @@ def main():
         logger.info("Skipping WebSocket tests")
         tester.test_configuration()
         tester.test_database_operations()
+        tester.test_ohlc_aggregation()
+        tester.test_concurrent_writes_and_reads()
+        tester.test_repeated_tick_after_rate_limit()
         tester.test_api_endpoints()
         
         # Summary for partial tests
-        total_tests = len(tester.test_results)
-        passed_tests = sum(1 for result in tester.test_results if result['success'])
-        failed_tests = total_tests - passed_tests
+        passed_tests = tester.passed_count
+        failed_tests = tester.failed_count
+        total_tests = passed_tests + failed_tests
         
         logger.info("=" * 60)
         logger.info("📊 Partial Test Summary:")
@@ -266,6 +384,8 @@ def main():
     else:
         success = tester.run_all_tests()
     
+    tester.close()
+    
     if not success:
         sys.exit(1)
 
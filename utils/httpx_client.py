@@ -12,6 +12,7 @@ logger = get_logger(__name__)
 # Global httpx clients for connection pooling
 _httpx_client_http2 = None  # For HTTP/2 with prior knowledge
 _httpx_client_http1 = None  # For HTTP/1.1
+_httpx_async_client = None  # For async callers on the event loop
 
 class HTTP2FallbackError(Exception):
     """Raised when falling back from HTTP/2 to HTTP/1.1"""
@@ -31,6 +32,27 @@ def get_httpx_client() -> httpx.Client:
         _httpx_client_http1 = _create_http_client(http2=False, http1=True)
     return _httpx_client_http1
 
+def get_async_httpx_client() -> httpx.AsyncClient:
+    """
+    Returns the shared async HTTP/1.1 client for use from the event loop.
+    
+    Returns:
+        httpx.AsyncClient: A configured async HTTP client
+    """
+    global _httpx_async_client
+    
+    if _httpx_async_client is None:
+        _httpx_async_client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(
+                max_keepalive_connections=50,
+                max_connections=100,
+                keepalive_expiry=300.0
+            )
+        )
+        logger.info("Created async HTTP client with support for: HTTP/1.1")
+    return _httpx_async_client
+
 def request_with_fallback(
     method: str,
     url: str,
@@ -138,3 +160,16 @@ def cleanup_httpx_client():
         _httpx_client_http1.close()
         _httpx_client_http1 = None
         logger.info("Closed HTTP/1.1 client")
+
+
+async def cleanup_async_httpx_client():
+    """
+    Closes the shared async httpx client.
+    Should be awaited when the application is shutting down.
+    """
+    global _httpx_async_client
+    
+    if _httpx_async_client is not None:
+        await _httpx_async_client.aclose()
+        _httpx_async_client = None
+        logger.info("Closed async HTTP client")
@@ -9,16 +9,32 @@ from utils.logging import get_logger
 logger = get_logger(__name__)
 
 
+def _ignore_market_data(topic: str, data: Dict[str, Any]):
+    """Default market data callback used until a handler is set"""
+
+
 class BaseBrokerWebSocketAdapter:
     """Base class for broker WebSocket adapters"""
     
     def __init__(self):
         self.connected = False
         self.subscriptions = {}
-        self.on_market_data: Optional[Callable] = None
+        self.on_market_data = None
+        self.on_disconnect: Optional[Callable] = None  # Called once the adapter stops reconnecting
         self.logger = logger
         self._zmq_initialized = False
     
+    @property
+    def on_market_data(self) -> Optional[Callable]:
+        """Callback invoked with (topic, data) for every market data message"""
+        return self._on_market_data
+    
+    @on_market_data.setter
+    def on_market_data(self, callback: Optional[Callable]):
+        self._on_market_data = callback
+        # Resolved once here so publish_market_data needs no None check per tick
+        self._publish = callback or _ignore_market_data
+    
     def initialize(self, broker_name: str, user_id: str, auth_data: Optional[Dict[str, str]] = None) -> None:
         """Initialize the adapter with broker-specific settings"""
         raise NotImplementedError("Subclasses must implement initialize()")
@@ -41,11 +57,18 @@ class BaseBrokerWebSocketAdapter:
     
     def publish_market_data(self, topic: str, data: Dict[str, Any]):
         """Publish market data to subscribers"""
-        if self.on_market_data:
+        try:
+            self._publish(topic, data)
+        except Exception as e:
+            self.logger.error(f"Error in market data callback: {e}")
+    
+    def notify_disconnect(self):
+        """Tell the owner the connection is lost and will not be retried"""
+        if self.on_disconnect:
             try:
-                self.on_market_data(topic, data)
+                self.on_disconnect()
             except Exception as e:
-                self.logger.error(f"Error in market data callback: {e}")
+                self.logger.error(f"Error in disconnect callback: {e}")
     
     def cleanup_zmq(self):
         """Clean up ZeroMQ resources"""
@@ -54,9 +77,7 @@ class BaseBrokerWebSocketAdapter:
     
     def _create_success_response(self, message: str, **kwargs) -> Dict[str, Any]:
         """Create a success response"""
-        response = {"status": "success", "message": message}
-        response.update(kwargs)
-        return response
+        return {"status": "success", "message": message, **kwargs}
     
     def _create_error_response(self, error_code: str, message: str) -> Dict[str, Any]:
         """Create an error response"""
@@ -2,12 +2,38 @@
 Symbol mapping utilities for broker integrations.
 Simplified implementation for the real-time price system.
 """
-from typing import Dict, Optional
-from database.token_db import get_token, get_br_symbol, get_brexchange
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from database.token_db import get_symbol, get_symbol_row, add_cache_listener
 from utils.logging import get_logger
 
 logger = get_logger(__name__)
 
+# Size of the resolved-symbol caches; each entry is a small tuple
+MAPPING_CACHE_SIZE = 8192
+
+
+@lru_cache(maxsize=MAPPING_CACHE_SIZE)
+def _lookup_token(symbol: str, exchange: str) -> Optional[Tuple[str, str, str]]:
+    """Resolve (symbol, exchange) to (token, brsymbol, brexchange), or None if unknown"""
+    row = get_symbol_row(symbol, exchange)
+    if not row or not row[0]:
+        return None
+    token, br_symbol, br_exchange = row
+    return token, br_symbol or symbol, br_exchange or exchange
+
+
+@lru_cache(maxsize=MAPPING_CACHE_SIZE)
+def _lookup_symbol(token: str, exchange: str) -> Optional[Tuple[str, str, str]]:
+    """Resolve (token, exchange) to (symbol, brsymbol, brexchange), or None if unknown"""
+    symbol = get_symbol(token, exchange)
+    if not symbol:
+        return None
+    row = get_symbol_row(symbol, exchange)
+    if not row:
+        return symbol, symbol, exchange
+    return symbol, row[1] or symbol, row[2] or exchange
+
 
 class SymbolMapper:
     """Maps symbols between different broker formats"""
@@ -25,17 +51,15 @@ class SymbolMapper:
             Dict with token info or None if not found
         """
         try:
-            token = get_token(symbol, exchange)
-            br_symbol = get_br_symbol(symbol, exchange)
-            br_exchange = get_brexchange(symbol, exchange)
+            row = _lookup_token(symbol, exchange)
             
-            if token:
+            if row:
                 return {
-                    'token': token,
+                    'token': row[0],
                     'symbol': symbol,
                     'exchange': exchange,
-                    'brsymbol': br_symbol or symbol,
-                    'brexchange': br_exchange or exchange
+                    'brsymbol': row[1],
+                    'brexchange': row[2]
                 }
             
             return None
@@ -57,19 +81,15 @@ class SymbolMapper:
             Dict with symbol info or None if not found
         """
         try:
-            from database.token_db import get_symbol
-            symbol = get_symbol(token, exchange)
+            row = _lookup_symbol(token, exchange)
             
-            if symbol:
-                br_symbol = get_br_symbol(symbol, exchange)
-                br_exchange = get_brexchange(symbol, exchange)
-                
+            if row:
                 return {
                     'token': token,
-                    'symbol': symbol,
+                    'symbol': row[0],
                     'exchange': exchange,
-                    'brsymbol': br_symbol or symbol,
-                    'brexchange': br_exchange or exchange
+                    'brsymbol': row[1],
+                    'brexchange': row[2]
                 }
             
             return None
@@ -77,3 +97,13 @@ class SymbolMapper:
         except Exception as e:
             logger.error(f"Error mapping token {token}.{exchange}: {e}")
             return None
+    
+    @staticmethod
+    def invalidate():
+        """Forget cached mappings, e.g. after the token data is reloaded"""
+        _lookup_token.cache_clear()
+        _lookup_symbol.cache_clear()
+
+
+# Drop cached mappings whenever token_db's own caches are cleared
+add_cache_listener(SymbolMapper.invalidate)